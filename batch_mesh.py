@@ -0,0 +1,152 @@
+import os
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from mesh_arrays import MeshArrays
+from mesh_utilities import get_points_on_3_point_quadratic_fit
+from mesh_utilities import get_ruled_coords, get_ruled_E2N
+from mesh_utilities import get_thickened_MeshArrays
+from bdf_writer import write_bdf, FIELD_FORMATS
+
+# A job file is JSON: one job, or {"jobs": [job, job, ...]}. A job is
+#   curve_1, curve_2 : a curve, one of
+#                      {"points": [[x, y, z], ...]}
+#                          exactly N_elms_X + 1 points, used as they are
+#                      {"quadratic": [[x1, y1, z1], [x2, y2, z2], [x3, y3, z3]]}
+#                          quadratic through 3 points (start, middle, end),
+#                          with N_elms_X + 1 points spaced evenly in its
+#                          parameter
+#                      {"step": "file.step", "edge": 1}
+#                          edge of a STEP file, counting from 1, split into
+#                          N_elms_X equal lengths (needs FreeCAD's Part)
+#   N_elms_X         : elements along the curves
+#   N_elms_Y         : elements between the curves
+#   thickness        : optional, sweep the shells into solids this thick
+#   layers           : optional, solid elements through the thickness (1)
+#   output           : BDF to write (its folder is made if need be)
+#   field_format     : optional, see FIELD_FORMATS ('short')
+#   flip_2           : optional, run curve_2 the other way (false)
+# Relative paths are relative to the job file. For example, a curved panel
+# 0.125 thick in 3 layers of solids:
+#   {"jobs": [
+#       {"curve_1": {"quadratic": [[0, 0, 0], [1, 0.5, 0], [2, 0, 0]]},
+#        "curve_2": {"quadratic": [[0, 0, 3], [1, 1, 3], [2, 0, 3]]},
+#        "N_elms_X": 40, "N_elms_Y": 60,
+#        "thickness": 0.125, "layers": 3,
+#        "output": "out/panel.bdf"}
+#   ]}
+JOB_KEYS = ['curve_1', 'curve_2', 'N_elms_X', 'N_elms_Y', 'output']
+
+def read_job_file(filename): # {{{
+    """ List of jobs in a job file, with their paths made absolute
+    """
+    with open(filename, mode='rt', encoding='utf-8') as f:
+        data = json.load(f)
+    jobs = data['jobs'] if isinstance(data, dict) and 'jobs' in data else data
+    if isinstance(jobs, dict):
+        jobs = [jobs]
+    job_dir = os.path.dirname(os.path.abspath(filename))
+    for job in jobs:
+        missing = [key for key in JOB_KEYS if key not in job]
+        if len(missing) != 0:
+            s = "Job in " + filename + " is missing " + ", ".join(missing)
+            raise ValueError(s)
+        job['output'] = os.path.join(job_dir, job['output'])
+        for key in ['curve_1', 'curve_2']:
+            if 'step' in job[key]:
+                job[key]['step'] = os.path.join(job_dir, job[key]['step'])
+    return jobs
+# }}}
+
+def get_curve_points(curve, N_elms): # {{{
+    """ N_elms + 1 points along a job file curve, shape (N_elms + 1, 3)
+    """
+    if 'points' in curve:
+        points = np.asarray(curve['points'], dtype=np.float64).reshape(-1, 3)
+        if len(points) != N_elms + 1:
+            s = "Curve has " + str(len(points)) + " points, needs "
+            s += str(N_elms + 1)
+            raise ValueError(s)
+        return points
+    if 'quadratic' in curve:
+        fit_points = np.asarray(curve['quadratic'], dtype=np.float64)
+        if fit_points.shape != (3, 3):
+            s = "Quadratic curve needs 3 points of [x, y, z], got shape "
+            s += str(fit_points.shape)
+            raise ValueError(s)
+        points = get_points_on_3_point_quadratic_fit(N_elms,
+                                                     fit_points.tolist())
+        return np.asarray(points, dtype=np.float64)
+    if 'step' in curve:
+        # FreeCAD's geometry kernel, which runs fine without the GUI
+        import Part
+        edge = Part.read(curve['step']).Edges[curve.get('edge', 1) - 1]
+        return np.array([tuple(v) for v in edge.discretize(N_elms + 1)],
+                        dtype=np.float64)
+    raise ValueError("Curve needs one of points, quadratic, or step")
+# }}}
+
+def run_job(job): # {{{
+    """ Mesh one job and write its BDF
+    Returns [output, N_nodes, N_elements].
+    """
+    N_elms_X = int(job['N_elms_X'])
+    N_elms_Y = int(job['N_elms_Y'])
+    PL1 = get_curve_points(job['curve_1'], N_elms_X)
+    PL2 = get_curve_points(job['curve_2'], N_elms_X)
+    if job.get('flip_2', False):
+        PL2 = PL2[::-1]
+    # the arrays shell_mesh_loft_between_two_curves makes its dicts from,
+    # so big panels don't go through a dict per node
+    coords = get_ruled_coords(PL1, PL2, N_elms_Y)
+    E2N = get_ruled_E2N(N_elms_X, N_elms_Y)
+    mesh = MeshArrays(np.arange(1, len(coords) + 1), coords, P2M={1: 1})
+    mesh.add_block(15, np.arange(1, len(E2N) + 1), E2N, 1)
+    if job.get('thickness') is not None:
+        mesh = get_thickened_MeshArrays(mesh, float(job['thickness']),
+                                        int(job.get('layers', 1)))
+    os.makedirs(os.path.dirname(job['output']), exist_ok=True)
+    write_bdf(job['output'], mesh, {1: 0}, {1: 0},
+              field_format=job.get('field_format', 'short'))
+    return [job['output'], mesh.N_nodes, mesh.N_elements]
+# }}}
+
+def run_jobs(jobs, N_workers=None): # {{{
+    """ run_job of every job, on a pool of worker processes
+    Results come back in the same order as jobs.
+    N_workers: defaults to one per cpu, up to the number of jobs
+    """
+    jobs = list(jobs)
+    if N_workers is None:
+        N_workers = min(len(jobs), os.cpu_count() or 1)
+    if N_workers <= 1:
+        return [run_job(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=N_workers) as executor:
+        return list(executor.map(run_job, jobs))
+# }}}
+
+def main(args=None): # {{{
+    """ Mesh every job of the job files given, without FreeCAD's GUI
+    Run as a script: python batch_mesh.py jobs.json [more.json] [-j N]
+    """
+    parser = argparse.ArgumentParser(description=
+        "Ruled shell and thickened solid meshes from job files, to BDF")
+    parser.add_argument('job_files', nargs='+')
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help="worker processes (default: one per cpu)")
+    args = parser.parse_args(args)
+    jobs = []
+    for filename in args.job_files:
+        jobs.extend(read_job_file(filename))
+    for job in jobs:
+        if job.get('field_format', 'short') not in FIELD_FORMATS:
+            s = "field_format must be one of " + ", ".join(FIELD_FORMATS)
+            raise ValueError(s)
+    for [output, N_nodes, N_elements] in run_jobs(jobs, args.workers):
+        print(output + ": " + str(N_nodes) + " nodes, " + str(N_elements)
+              + " elements")
+# }}}
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+import numpy as np
+from nastran_format import get_short_form_floats, get_large_field_floats
+from mesh_renumbering import get_part_replacements, replace_IDs
+
+# number of elements or nodes turned into text at a time
+CHUNK_SIZE = 2**16
+
+ELEMENT_TYPE_TO_DIMENSION = {1:1, 2:1, 3:1, 4:1, 5:1, 6:1, 7:3, 8:0, 9:0,
+    10:0, 11:0, 12:0, 13:1, 14:3, 15:2, 16:2, 17:1, 18:2, 19:3, 20:2, 21:2}
+
+# short: 8 character fields, reals squeezed into 8 characters
+# large: GRID* cards with 16 character reals, everything else short field
+# free:  comma separated, no padding, reals with large field precision
+FIELD_FORMATS = ['short', 'large', 'free']
+
+# element type ID: [card name, supported node count, error if it isn't]
+ELEMENT_CARDS = {
+    7:  ["CHEXA", 8, "As of 2021.10.16, only 8 noded CHEXA elements supported"],
+    14: ["CPENTA", 6,
+         "As of 2026.10.17, only 6 noded CPENTA elements supported"],
+    15: ["CQUAD4", 4, "CQUAD4 elements must have 4 nodes"],
+    19: ["CTETRA", 10,
+         "As of 2021.10.17, only 10 noded CTETRA elements supported"],
+    20: ["CTRIA3", 3, "As of 2021.10.31, only 3 noded CTRIA3 elements supported"],
+}
+
+def get_card_format(name, N_fields, field_format='short'): # {{{
+    """ printf style template of a card with N_fields integers
+    Eight fields go on the first line and eight on each continuation line,
+    which starts with an empty field, same as the cards were always written.
+    Integers always fit in 8 characters, so large field writes these short.
+    """
+    if field_format == 'free':
+        fields = ["%d"] * N_fields
+        lines = [",".join([name] + fields[:8])]
+        for i in range(8, N_fields, 8):
+            lines.append(",".join([""] + fields[i:i+8]))
+        return "\n".join(lines)
+    fields = ["%-8d"] * N_fields
+    lines = [name + " " * (8 - len(name)) + "".join(fields[:8])]
+    for i in range(8, N_fields, 8):
+        lines.append(" " * 8 + "".join(fields[i:i+8]))
+    return "\n".join(lines)
+# }}}
+
+def get_GRID_lines(NIDs, coords, field_format='short'): # {{{
+    """ GRID card lines of a chunk of nodes
+    """
+    NIDs = NIDs.tolist()
+    if field_format == 'short':
+        coords = get_short_form_floats(coords).tolist()
+        return ["GRID    %-8d        %s%s%s" % (n, x, y, z)
+                for [n, [x, y, z]] in zip(NIDs, coords)]
+    coords = get_large_field_floats(coords).tolist()
+    if field_format == 'large':
+        return ["GRID*   %-16d                %s%s\n*       %s" % (n, x, y, z)
+                for [n, [x, y, z]] in zip(NIDs, coords)]
+    return ["GRID,%d,,%s,%s,%s" % (n, x.strip(), y.strip(), z.strip())
+            for [n, [x, y, z]] in zip(NIDs, coords)]
+# }}}
+
+def get_property_and_material_cards(parts, P2T, M2T, field_format='short'):
+    # {{{
+    """ PSHELL/PSOLID and MAT1 lines, worked out from the element blocks
+    Same rules as before: every property and material has to be used by
+    elements of exactly one dimension (CHEXAs and CPENTAs may share a
+    PSOLID), and only default (0) types are supported.
+    """
+    P2E_types = {}
+    P2M = {}
+    for part in parts:
+        for e_type, block in part.blocks.items():
+            for PID in np.unique(block.PIDs).tolist():
+                P2E_types.setdefault(PID, set()).add(e_type)
+        P2M.update(part.P2M)
+
+    def get_dimension(PID):
+        type_IDs = P2E_types.get(PID, set())
+        dimensions = set(ELEMENT_TYPE_TO_DIMENSION[t] for t in type_IDs)
+        if len(dimensions) != 1:
+            # if there's more than one dimension, throw error.
+            # I don't want to deal with that right now.
+            s = "More than one element type not allowed at a time (yet)"
+            raise ValueError(s)
+        dimension = list(dimensions)[0]
+        if dimension == 0:
+            s = "Elements of dimension 0 not supported (yet)"
+            raise ValueError(s)
+        elif dimension == 1:
+            s = "Elements of dimension 1 not supported (yet)"
+            raise ValueError(s)
+        return dimension
+
+    property_cards = []
+    for PID in P2T.keys():
+        if P2T[PID] != 0:
+            s = "As of 2021.10.16, non default property types not supported"
+            raise ValueError(s)
+        if get_dimension(PID) == 2:
+            name = "PSHELL"
+        else:
+            name = "PSOLID"
+        s = get_card_format(name, 2, field_format) % (PID, P2M[PID])
+        property_cards.append(s)
+
+    material_cards = []
+    for MID in M2T.keys():
+        if M2T[MID] != 0:
+            s = "As of 2021.10.16, non default material types not supported"
+            raise ValueError(s)
+        PIDs = [PID for PID in P2M.keys() if P2M[PID] == MID]
+        if len(PIDs) != 1:
+            s = "More than one property using a material not allowed at this time"
+            raise ValueError(s)
+        get_dimension(PIDs[0])
+        material_cards.append(get_card_format("MAT1", 1, field_format) % MID)
+    return [property_cards, material_cards]
+    # }}}
+
+def write_lines(bdf, lines, is_first=False): # {{{
+    """ Write lines separated by newlines, with no newline after the last
+    """
+    if len(lines) == 0:
+        return
+    if not is_first:
+        bdf.write("\n")
+    bdf.write("\n".join(lines))
+# }}}
+
+def write_element_cards(bdf, mesh, field_format, old_NIDs, new_NIDs,
+                        chunk_size, progress): # {{{
+    """ Stream the element cards of one MeshArrays, in element ID order
+    Node IDs found in old_NIDs (sorted) are written as new_NIDs instead.
+    progress(N) is called with the number of elements in each chunk.
+    """
+    e_types = list(mesh.blocks.keys())
+    formats = [get_card_format(ELEMENT_CARDS[t][0], ELEMENT_CARDS[t][1] + 2,
+                               field_format) for t in e_types]
+    EIDs = mesh.EIDs
+    which_block = np.repeat(np.arange(len(e_types)),
+                            [len(mesh.blocks[t].EIDs) for t in e_types])
+    row_in_block = np.concatenate(
+        [np.arange(len(mesh.blocks[t].EIDs)) for t in e_types] +
+        [np.zeros(0, dtype=int)])
+    order = np.argsort(EIDs, kind='stable')
+    for start in range(0, len(order), chunk_size):
+        chunk = order[start:start+chunk_size]
+        lines = np.empty(len(chunk), dtype=object)
+        for [b, e_type] in enumerate(e_types):
+            in_block = np.flatnonzero(which_block[chunk] == b)
+            if len(in_block) == 0:
+                continue
+            block = mesh.blocks[e_type]
+            rows = row_in_block[chunk[in_block]]
+            E2N_NIDs = replace_IDs(old_NIDs, new_NIDs,
+                                   mesh.NIDs[block.E2N[rows]])
+            fields = np.column_stack((block.EIDs[rows], block.PIDs[rows],
+                                      E2N_NIDs))
+            lines[in_block] = [formats[b] % tuple(f) for f in fields.tolist()]
+        write_lines(bdf, lines.tolist())
+        progress(len(chunk))
+# }}}
+
+def write_GRID_cards(bdf, mesh, field_format, dropped_NIDs, chunk_size,
+                     progress): # {{{
+    """ Stream the GRID cards of one MeshArrays, in node ID order
+    Nodes in dropped_NIDs (sorted) are left out.
+    progress(N) is called with the number of nodes in each chunk.
+    """
+    is_kept = np.ones(mesh.N_nodes, dtype=bool)
+    if len(dropped_NIDs) > 0:
+        index = np.searchsorted(dropped_NIDs, mesh.NIDs)
+        index = index.clip(max=len(dropped_NIDs)-1)
+        is_kept = dropped_NIDs[index] != mesh.NIDs
+    for start in range(0, mesh.N_nodes, chunk_size):
+        kept = is_kept[start:start+chunk_size]
+        NIDs = mesh.NIDs[start:start+chunk_size][kept]
+        coords = mesh.coords[start:start+chunk_size][kept]
+        write_lines(bdf, get_GRID_lines(NIDs, coords, field_format))
+        progress(len(kept))
+# }}}
+
+def write_bulkdata(bdf, mesh, P2T, M2T, progress=None, chunk_size=CHUNK_SIZE,
+                   field_format='short', replacements=None): # {{{
+    """ Stream the bulk data of a MeshArrays out to an open text file
+    Writes the same text '\n'.join(create_bulkdata_list(...)) used to, but
+    a chunk of elements or nodes at a time, so memory doesn't grow with the
+    size of the model. Elements go out in element ID order, nodes in node
+    ID order.
+    mesh: a MeshArrays, or a list of them (parts), written one after another
+          without merging, so their IDs mustn't collide
+    progress: optional callable, progress(N_done, N_total), called after
+              every chunk, counting elements and nodes.
+    field_format: 'short', 'large' or 'free', see FIELD_FORMATS
+    replacements: optional NodeReplacements table of the parts; replaced
+                  node IDs are swapped out in the element cards and their
+                  GRIDs left out, gluing the parts together
+    Everything is checked before anything is written.
+    """
+    if field_format not in FIELD_FORMATS:
+        s = "field_format must be one of " + ", ".join(FIELD_FORMATS)
+        raise ValueError(s)
+    parts = mesh if isinstance(mesh, (list, tuple)) else [mesh]
+    for part in parts:
+        for e_type, block in part.blocks.items():
+            if e_type not in ELEMENT_CARDS:
+                s = "AS of 2021.10.16, only types 7, 5, and 19 supported."
+                raise ValueError(s)
+            if block.E2N.shape[1] != ELEMENT_CARDS[e_type][1]:
+                raise ValueError(ELEMENT_CARDS[e_type][2])
+    [property_cards, material_cards] = get_property_and_material_cards(
+        parts, P2T, M2T, field_format)
+
+    N_total = sum(part.N_elements + part.N_nodes for part in parts)
+    N_done = [0]
+    def advance(N):
+        N_done[0] += N
+        if progress is not None:
+            progress(N_done[0], N_total)
+
+    write_lines(bdf, ["BEGIN BULK", ""], is_first=True)
+    write_lines(bdf, property_cards + [""])
+    write_lines(bdf, material_cards + [""])
+    for i, part in enumerate(parts):
+        [old_NIDs, new_NIDs] = get_part_replacements(replacements, i)
+        write_element_cards(bdf, part, field_format, old_NIDs, new_NIDs,
+                            chunk_size, advance)
+    write_lines(bdf, [""])
+    for i, part in enumerate(parts):
+        [old_NIDs, new_NIDs] = get_part_replacements(replacements, i)
+        write_GRID_cards(bdf, part, field_format, old_NIDs, chunk_size,
+                         advance)
+    write_lines(bdf, ["ENDDATA"])
+    # }}}
+
+def write_bdf(filename, mesh, P2T, M2T, progress=None, field_format='short',
+              replacements=None): # {{{
+    """ Open filename and stream the bulk data of mesh into it
+    """
+    with open(filename, mode='wt', encoding='utf-8', buffering=2**20) as bdf:
+        write_bulkdata(bdf, mesh, P2T, M2T, progress=progress,
+                       field_format=field_format, replacements=replacements)
+    # }}}
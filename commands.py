@@ -41,7 +41,8 @@ __date__    = '2021'
 import FreeCAD as App
 import FreeCADGui as Gui
 
-from task_ruled import TaskPanel
+# the task panel (PySide, Part, numpy) is imported when the command runs,
+# so loading the workbench doesn't pay for it
 
 icon_path = App.getUserAppDataDir() + 'Mod/FCMesher/Resources/'
 
@@ -58,6 +59,7 @@ class RuledMesh():
 
     def Activated(self):
         """command has been triggered"""
+        from task_ruled import TaskPanel
         panel = TaskPanel()
         Gui.Control.showDialog(panel)        
         return
@@ -1,114 +1,15 @@
 # App = FreeCAD, Gui = FreeCADGui
-import FreeCAD, Part, Fem
-from PySide import QtGui
+# FreeCAD is imported in main, so the functions here load in plain python too
 from copy import copy as copy
-import math
 import re
+import os
+import sys
+import numpy as np
 
-def get_N2E(E2N): # {{{
-    """ Turns the E2N around, giving a dict of N2E
-    """
-    N2E = {}
-    for EID, Element in E2N.items():
-        # go through nodes in every element
-        for NID in Element:
-            # if the node's not in N2E yet, prepare for it to be
-            if NID not in N2E:
-                N2E[NID] = []
-            # store the EID with that node ID we're on
-            N2E[NID].append(EID)
-    return N2E
-# }}}
-
-def get_optimal_short_form_float(x): # {{{
-    """ Get optimal way to print the number in 8 characters
-    """
-    x_raw_string = "{:50.100f}".format(x)
-    # check for zero
-    if x == 0.0: 
-        x_str = " 0.0    "
-        return x_str
-
-    # check for power of 10
-    if math.log(abs(round(x,7)),10).is_integer(): 
-        x_str = "1." + "+" + str(int(math.log(round(x,7),10)))
-        x_str += " " * (8 - len(x_str))
-        return x_str
-
-    # get the order of magnitude of the point coordinates
-    order = math.ceil(math.log(abs(x),10))
-    if order == 0:
-        order_of_order = 0
-    elif order > 0:
-        order_of_order = math.ceil(math.log(abs(order+1),10))
-    elif order < 0:
-        order_of_order = math.ceil(math.log(abs(order-1),10))
-
-    # get optimal number of data characters allowed
-    if x > 0:
-        if order >= 7:
-            reduced_number = x/(10**(order-1))
-            reduced_number = round(reduced_number,6)
-            format_string = "{:1." + str(5 - order_of_order) + "f}"
-            reduced_number = format_string.format(reduced_number)
-            x_str = reduced_number + "+" + str(order)
-        elif order < -2:
-            reduced_number = x/(10**(order-1))
-            reduced_number = round(reduced_number,6)
-            format_string = "{:1." + str(5 - order_of_order) + "f}"
-            reduced_number = format_string.format(reduced_number)
-            x_str = reduced_number + str(order)
-        else: # this means just use the raw number
-            x = round(x,7)
-            format_string = "{:"
-            lower_order = math.floor(math.log(abs(x),10))
-            format_string += str(max(order,0))
-            format_string += "."
-            if order == lower_order:
-                format_string += str(6 - max(order,0))
-            else:
-                format_string += str(7 - max(order,0))
-            format_string += "f}"
-            if order > 0:
-                x_str = format_string.format(x)
-            else:
-                x_str = format_string.format(x)[1:]
-    else:
-        if order >= 6:
-            reduced_number = x/(10**(order-1))
-            reduced_number = round(reduced_number,6)
-            format_string = "{:1." + str(4 - order_of_order) + "f}"
-            reduced_number = format_string.format(reduced_number)
-            x_str = reduced_number + "+" + str(order)
-        elif order < -2:
-            reduced_number = x/(10**(order-1))
-            reduced_number = round(reduced_number,6)
-            format_string = "{:1." + str(4 - order_of_order) + "f}"
-            reduced_number = format_string.format(reduced_number)
-            x_str = reduced_number + str(order)
-        else:
-            format_string = "{:"
-            format_string += str(max(order,0))
-            format_string += "."
-            if math.log(x,10).is_integer():
-                format_string += str(5 - max(order,0))
-            else:
-                format_string += str(6 - max(order,0))
-            format_string += "f}"
-            if order > 0:
-                x_str = format_string.format(x)
-            else:
-                x_str = format_string.format(x)[0] + format_string.format(x)[2:]
-
-    # check that x_str is the right length
-    if len(x_str) != 8:
-        print(x_str)
-        print(x)
-        print(math.log(x,10))
-        raise ValueError("printed value string is wrong length!")
-
-    return x_str
-    # }}}
+currentdir = os.path.dirname(os.path.realpath(__file__))
+parentdir = os.path.dirname(currentdir)
+sys.path.append(parentdir)
+from nastran_format import get_short_form_floats
 
 def create_bulkdata_list(nodes, E2N, E2T, E2P, P2M, P2T, M2T): #{{{
     """ Create giant list, with each entry being a line 
@@ -285,19 +186,13 @@ def create_bulkdata_list(nodes, E2N, E2T, E2P, P2M, P2T, M2T): #{{{
     bulkdata.append("")
 
     # Grids
-    for n in nodes.keys(): # {{{
+    # turn all the coordinates into the most efficient short form numbers
+    coords = np.array([nodes[n][0:3] for n in nodes.keys()], dtype=float)
+    coord_strs = get_short_form_floats(coords.reshape(-1, 3)).tolist()
+    for [n, [x_str, y_str, z_str]] in zip(nodes.keys(), coord_strs): # {{{
         s = "GRID    "
         s += str(int(n)) + " " * (8 - len(str(int(n))))
         s += " " * 8
-        # get the point coordinates
-        x = nodes[n][0]
-        y = nodes[n][1]
-        z = nodes[n][2]
-
-        # turn these into the most efficient short form numbers
-        x_str = get_optimal_short_form_float(x)
-        y_str = get_optimal_short_form_float(y)
-        z_str = get_optimal_short_form_float(z)
 
         # append coords to the string
         s += x_str
@@ -473,6 +368,9 @@ def main():
     * as of 2021.10.24, shelved. Author is too stupid to think of ways to chunk 
     the state permutations into finite cases, at time of writing.
     """
+    import FreeCAD
+    import FreeCADGui as Gui
+    App = FreeCAD
     selected_objects = [] 
     for obj in Gui.Selection.getSelectionEx():
         selected_objects.append(obj.Object)
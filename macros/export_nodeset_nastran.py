@@ -2,7 +2,6 @@
 import FreeCAD, Part, Fem
 from PySide import QtGui
 from copy import copy as copy
-import math
 import re
 
 class Form(QtGui.QDialog): # {{{
@@ -38,97 +37,6 @@ def write_include_file_out(filename, file_contents): # {{{
     return
 # }}}
 
-def get_optimal_short_form_float(x): # {{{
-    """ Get optimal way to print the number in 8 characters
-    """
-    x_raw_string = "{:50.100f}".format(x)
-    # check for zero
-    if x == 0.0: 
-        x_str = " 0.0    "
-        return x_str
-
-    # check for power of 10
-    if math.log(abs(round(x,7)),10).is_integer(): 
-        x_str = "1." + "+" + str(int(math.log(round(x,7),10)))
-        x_str += " " * (8 - len(x_str))
-        return x_str
-
-    # get the order of magnitude of the point coordinates
-    order = math.ceil(math.log(abs(x),10))
-    if order == 0:
-        order_of_order = 0
-    elif order > 0:
-        order_of_order = math.ceil(math.log(abs(order+1),10))
-    elif order < 0:
-        order_of_order = math.ceil(math.log(abs(order-1),10))
-
-    # get optimal number of data characters allowed
-    if x > 0: # positive
-        if order >= 7:
-            reduced_number = x/(10**(order-1))
-            reduced_number = round(reduced_number,6)
-            format_string = "{:1." + str(5 - order_of_order) + "f}"
-            reduced_number = format_string.format(reduced_number)
-            x_str = reduced_number + "+" + str(order)
-        elif order < -2:
-            reduced_number = x/(10**(order-1))
-            reduced_number = round(reduced_number,6)
-            format_string = "{:1." + str(5 - order_of_order) + "f}"
-            reduced_number = format_string.format(reduced_number)
-            x_str = reduced_number + str(order)
-        else: # this means just use the raw number
-            x = round(x,7)
-            format_string = "{:"
-            lower_order = math.floor(math.log(abs(x),10))
-            format_string += str(max(order,0))
-            format_string += "."
-            if order == lower_order:
-                format_string += str(6 - max(order,0))
-            else:
-                format_string += str(7 - max(order,0))
-            format_string += "f}"
-            if order > 0:
-                x_str = format_string.format(x)
-            else:
-                x_str = format_string.format(x)[1:]
-    else: # negative
-        if order >= 6:
-            reduced_number = x/(10**(order-1))
-            reduced_number = round(reduced_number,6)
-            format_string = "{:1." + str(4 - order_of_order) + "f}"
-            reduced_number = format_string.format(reduced_number)
-            x_str = reduced_number + "+" + str(order)
-        elif order < -2:
-            reduced_number = x/(10**(order-1))
-            reduced_number = round(reduced_number,6)
-            format_string = "{:1." + str(4 - order_of_order) + "f}"
-            reduced_number = format_string.format(reduced_number)
-            x_str = reduced_number + str(order)
-        else:
-            format_string = "{:"
-            format_string += str(max(order,0))
-            format_string += "."
-            # check if is a power of 10
-            if math.log(abs(x),10).is_integer():
-                format_string += str(5 - max(order,0))
-            else:
-                format_string += str(6 - max(order,0))
-            format_string += "f}"
-            if order > 0:
-                x_str = format_string.format(x)
-            else:
-                x_str = format_string.format(x)[0] + format_string.format(x)[2:]
-
-    # check that x_str is the right length
-    if len(x_str) != 8:
-        print(x_str)
-        print(x)
-        print(math.log(x,10))
-        raise ValueError("printed value string is wrong length!")
-
-    return x_str
-    # }}}
-
 def is_valid_nastran_real(x): #{{{
     """
     Return True if x is a valid nastran real as a string
@@ -1,6 +1,10 @@
-import FreeCAD, Part, Fem
-from PySide import QtGui
-import copy
+# FreeCAD is imported in main, so the functions here load in plain python too
+import os
+import sys
+currentdir = os.path.dirname(os.path.realpath(__file__))
+parentdir = os.path.dirname(currentdir)
+sys.path.append(parentdir)
+from mesh_arrays import get_MeshArrays_from_FemMeshes
 
 def check_that_a_FemMesh_object_is_selected(gui_selection): # {{{
     '''
@@ -21,113 +25,12 @@ def get_data_from_mesh_objects(mesh_objects): # {{{
     """
     Bug observed on 2021.10.24:
         If mesh does not have compactly numbered nodes, this crushes its numbering
+    Each mesh is pulled into a MeshArrays container first, which is then
+    expanded into the nodes, E2N, E2T, E2P, and P2M dicts. Meshes are
+    independent, so they're pulled in concurrently, in selection order.
     """
     # get 'data' from mesh objects
-    data = []
-    for i in range(len(mesh_objects)):
-        data.append({})
-    for mesh_number, mesh in enumerate(mesh_objects): 
-        # preallocate popualted data structures
-        nodes = {}  # Node ID to location
-        E2N = {}    # Element to Node ID
-        E2T = {}    # Element to Type ID
-        E2P = {}    # Element to Property ID
-        P2M = {}    # Property to Material ID
-        # get nodes for this mesh 
-        #NID = max(nodes.keys(), default=0) # Node ID
-        # not sure why I was doing that.^^
-        # that results in the 2021.10.24 bug.
-        for node in mesh.Nodes:
-            #NID += 1
-            NID = node
-            nodes[NID] = list(mesh.getNodeById(node))
-        # get E2N, E2T, E2P, and P2M for this mesh
-        if mesh.EdgeCount != 0: # {{{
-            s = "Edges not supported as of 2021.10.16"
-            print(s)
-            # }}}
-        if mesh.TriangleCount != 0: # Type 20 {{{
-            EID = max(E2N.keys(), default=0)        # Element ID
-            PID = max(E2P.keys(), default=0) + 1    # Property ID
-            MID = max(P2M.keys(), default=0) + 1    # Material ID
-            for face in mesh.Faces:
-                # if it's 3 noded, it's a TRIA3 element
-                if len(mesh.getElementNodes(face)) == 3:
-                    EID += 1
-                    OG = list(mesh.getElementNodes(face))    # original order
-                    E2N[EID] = [OG[0], OG[1], OG[2]]  # correct order?
-                    E2N[EID] = list(mesh.getElementNodes(face))
-                    E2T[EID] = 20
-                    E2P[EID] = PID
-                    P2M[PID] = MID
-            #}}}
-        if mesh.QuadrangleCount != 0: # Type 15 {{{
-            EID = max(E2N.keys(), default=0)        # Element ID
-            PID = max(E2P.keys(), default=0) + 1    # Property ID
-            MID = max(P2M.keys(), default=0) + 1    # Material ID
-            for face in mesh.Faces:
-                # if it's 4 noded, it's a QUAD4 element
-                if len(mesh.getElementNodes(face)) == 4:
-                    EID += 1
-                    # un-salome'ifying
-                    OG = list(mesh.getElementNodes(face))    # original order
-                    E2N[EID] = [OG[0], OG[3], OG[2], OG[1]]  # correct order
-                    E2N[EID] = list(mesh.getElementNodes(face))
-                    E2T[EID] = 15
-                    E2P[EID] = PID
-                    P2M[PID] = MID
-            # }}}
-        if mesh.HexaCount != 0:       # Type 7 {{{
-            EID = max(E2N.keys(), default=0)        # Element ID
-            PID = max(E2P.keys(), default=0) + 1    # Property ID
-            MID = max(P2M.keys(), default=0) + 1    # Material ID
-            for volume in mesh.Volumes:
-                # if it's 8 noded, it's a CHEXA element with 8 nodes
-                if len(mesh.getElementNodes(volume)) == 8:
-                    EID += 1
-                    # un-salome'ifying
-                    OG = list(mesh.getElementNodes(volume))
-                    E2N[EID] = \
-                    [OG[6], OG[7], OG[4], OG[5], OG[2], OG[3], OG[0], OG[1]]
-                    E2T[EID] = 7
-                    E2P[EID] = PID
-                    P2M[PID] = MID
-                else:
-                    s = "As of 2021.10.17, CHEXA 20 elements are not supported."
-                    raise ValueError(s)
-            # }}}
-        if mesh.TetraCount != 0:      # Type 19 {{{
-            EID = max(E2N.keys(), default=0)        # Element ID
-            PID = max(E2P.keys(), default=0) + 1    # Property ID
-            MID = max(P2M.keys(), default=0) + 1    # Material ID
-            for volume in mesh.Volumes:
-                # if it's 10 noded, it's a CTETRA element with 10 nodes
-                if len(mesh.getElementNodes(volume)) == 10:
-                    EID += 1
-                    # un-salome'ifying
-                    OG = list(mesh.getElementNodes(volume))
-                    E2N[EID] = [OG[3], OG[2], OG[0], OG[1], OG[9], OG[6],\
-                                OG[7], OG[8], OG[5], OG[4]]
-                    E2T[EID] = 19
-                    E2P[EID] = PID
-                    P2M[PID] = MID
-                else:
-                    s = "As of 2021.10.17, CTETRA 4 elements are not supported."
-                    raise ValueError(s)
-            # }}}
-        if mesh.PyramidCount != 0: # {{{
-            s = "Pyramids not supported as of 2021.10.16"
-            raise ValueError(s)
-             # }}}
-        if mesh.PrismCount != 0: # {{{
-            s = "Prisms not supported as of 2021.10.16"
-            raise ValueError(s)
-            # }}}
-        data[mesh_number]['nodes'] = copy.deepcopy(nodes)
-        data[mesh_number]['E2N'] = copy.deepcopy(E2N)
-        data[mesh_number]['E2T'] = copy.deepcopy(E2T)
-        data[mesh_number]['E2P'] = copy.deepcopy(E2P)
-        data[mesh_number]['P2M'] = copy.deepcopy(P2M)
+    data = get_MeshArrays_from_FemMeshes(mesh_objects, to_dicts=True)
     return data
 # }}}
 
@@ -143,6 +46,9 @@ def main():
     - [X] make a new E2N with the order of nodes reversed
     - [X] Add and show the FemMesh thing
     '''
+    import FreeCAD, Fem
+    import FreeCADGui as Gui
+    App = FreeCAD
     # check that a FemMesh object is selected
     gui_selection = Gui.Selection.getSelectionEx()
     N_things_selected = check_that_a_FemMesh_object_is_selected(gui_selection)
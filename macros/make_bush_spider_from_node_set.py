@@ -1,8 +1,9 @@
 # App = FreeCAD, Gui = FreeCADGui
-import FreeCAD, Part, Fem
-Vector = App.Vector
 
 def main(): # {{{
+    import FreeCAD, Fem
+    import FreeCADGui as Gui
+    App = FreeCAD
 
     # get nodelist that's clicked on
     node_set_entities = [] 
@@ -1,18 +1,21 @@
 # App = FreeCAD, Gui = FreeCADGui
-import FreeCAD, Part, Fem
-from PySide import QtGui
+# FreeCAD and PySide are imported where they're used, so the functions here
+# load in plain python too; the card writing lives in rbe3_writer.py
+import os
+import sys
 import numpy as np
-import math
-from scipy.spatial import KDTree
-Vector = App.Vector
-
-def get_E2N_nodes_and_E2T(mesh_objects_to_merge): # {{{
-    """ takes in FemMesh objects, returns a combined E2N and nodes
-    - [ ] Make it also return an E2T once other element types are supported
+currentdir = os.path.dirname(os.path.realpath(__file__))
+parentdir = os.path.dirname(currentdir)
+sys.path.append(parentdir)
+from mesh_arrays import get_MeshArrays_from_FemMeshes
+from mesh_renumbering import merge_MeshArrays
+from spatial_index import SpatialIndex, get_spatial_index
+from bdf_writer import get_GRID_lines
+from rbe3_writer import get_RBE3_lines, read_fastener_csv, write_RBE3_include
+
+def check_mesh_types(mesh_objects_to_merge): # {{{
+    """ raise if any of the FemMesh objects hold anything but CQUAD4s
     """
-
-    mesh_types_expected = []
-    # check all mesh entities for pre-coded types # {{{
     for obj in mesh_objects_to_merge:
         # if there are any edge elements, raise error and abort
         if obj.EdgeCount != 0:
@@ -22,7 +25,7 @@ def get_E2N_nodes_and_E2T(mesh_objects_to_merge): # {{{
             s = "Triangles not supported as of 2021.08.22"
             raise ValueError(s)
         elif obj.QuadrangleCount !=0:
-            mesh_types_expected.append(15)
+            continue
         elif obj.HexaCount != 0:
             s = "Hexas not supported as of 2021.08.22"
             raise ValueError(s)
@@ -38,118 +41,43 @@ def get_E2N_nodes_and_E2T(mesh_objects_to_merge): # {{{
         elif obj.PrismCount != 0:
             s = "Prisms not supported as of 2021.08.22"
             raise ValueError(s)
-    # }}}
-    mesh_types_expected = list(set(mesh_types_expected))
+# }}}
 
-    # get [body ID, node ID old, node ID new]
-    nid_transform = []
-    body_ID = 1
-    NID = 1
-    for obj in mesh_objects_to_merge:
-        for n in obj.Nodes:
-            nid_transform.append([body_ID, n, NID])
-            NID += 1
-        body_ID += 1
-    # get [body ID, EID old, EID new]
-    eid_transform = []
-    body_ID = 1
-    EID = 1
-    for obj in mesh_objects_to_merge:
-        for e in obj.Faces:
-            eid_transform.append([body_ID, e, EID])
-            EID += 1
-        body_ID += 1
-
-    # create E2N for the ascending order
-    current_body_ID = 0
-    EID = 1
-    E2N = {}
-    for obj in mesh_objects_to_merge:
-        current_body_ID += 1
-        # get the part of eid transform that's in this body
-        eid_transform_relevant = []
-        for e in eid_transform:
-            if e[0] == current_body_ID:
-                eid_transform_relevant.append(e)
-        # get the part of nid transform that's in this body
-        nid_transform_relevant = []
-        for n in nid_transform:
-            if n[0] == current_body_ID:
-                nid_transform_relevant.append(n)
-        # making node ID dictionary [old --> new]
-        n_rel = {}
-        for n in nid_transform_relevant:
-            n_rel[n[1]] = n[2]
-        # for the relevant elements, make E2N
-        for e in eid_transform_relevant:
-            EID_old = e[1]
-            EID_new = e[2]
-            nodes_in_elm = list(obj.getElementNodes(EID_old))
-            # replace nodes in elm with its new node IDs
-            new_nodes_in_elm = []
-            for n in nodes_in_elm:
-                NID_new = n_rel[n]
-                new_nodes_in_elm.append(NID_new)
-            E2N[EID_new] = new_nodes_in_elm
-    # create nodes
-    nodes = {}
-    for n in nid_transform:
-        body_index = n[0] - 1
-        old_NID = n[1]
-        new_NID = n[2]
-        obj = mesh_objects_to_merge[body_index]
-        nodes[new_NID] = list(obj.Nodes[old_NID])
-
-    # check that there was only one type of element, and it was 15 (CQUAD4)
-
-    E2T = {}
-    if len(mesh_types_expected) == 1 and mesh_types_expected[0] == 15:
-        # Populate the E2T
-        for e in E2N:
-            E2T[e] = 15
-    else:
-        raise ValueError("Unknown elements passed into mesh equivalencer.")
+def get_combined_mesh(mesh_objects_to_merge): # {{{
+    """ takes in FemMesh objects, returns them as one compactly numbered
+    MeshArrays: nodes and elements numbered from 1, body by body
+    """
+    check_mesh_types(mesh_objects_to_merge)
+    parts = get_MeshArrays_from_FemMeshes(mesh_objects_to_merge)
+    return merge_MeshArrays(parts, 'compact')
+# }}}
 
-    return [E2N, E2T, nodes]
+def get_E2N_nodes_and_E2T(mesh_objects_to_merge): # {{{
+    """ takes in FemMesh objects, returns a combined E2N and nodes
+    - [ ] Make it also return an E2T once other element types are supported
+    - [X] 2026.10.17 | built from get_combined_mesh, same numbering
+    """
+    data = get_combined_mesh(mesh_objects_to_merge).to_dicts()
+    return [data['E2N'], data['E2T'], data['nodes']]
 #}}}
 
 def get_nodes_within_tolerance(nodes, distance, x, y, z): # {{{
     """ Takes in nodes and distance, returns list of node IDs within distance
+    nodes is either the {NID: [x, y, z]} dict or a MeshArrays; a MeshArrays
+    reuses its cached spatial index, so asking again costs only the search.
+    - [X] 2026.10.17 | returns node IDs, not indices into the tree
     """
-    # Creating NID to index 
-    NID2index = {}
-    index2NID = {}
-    counter = 0
-    for i in list(nodes.keys()):
-        NID2index[i] = counter
-        index2NID[counter] = i
-        counter += 1
-
-    # constructing list of lists of node IDs
-    node_coords_list = []
-    for NID in list(nodes.keys()):
-        node_coords_list.append(nodes[NID])
-    # converting node_coords_list to nparray
-    node_coords_list = np.array(node_coords_list)
-
-    # Construct the tree containing the nodal data
-    tree = KDTree(node_coords_list)
-
-    nodes_within_ball = tree.query_ball_point([x, y, z], distance)
-    return nodes_within_ball
-
-    #}}}
-
-def main(): # {{{
-    # get all the nodes near the point I hard code here
-    x = 12.7
-    y = 12.7
-    z = 0.0
-
-    # set MPC creation tolerance
-    R = 25.4 * 0.125
+    if isinstance(nodes, dict):
+        index = SpatialIndex.from_dict(nodes)
+    else:
+        index = get_spatial_index(nodes)
+    return index.query_ball([x, y, z], distance).tolist()
+# }}}
 
-    # get mesh that's clicked on
+def get_selected_FemMeshes(): # {{{
+    """ FemMesh of every mesh object selected in the GUI
+    """
+    import FreeCADGui as Gui
     mesh_objects_selected = [] 
     for obj in Gui.Selection.getSelectionEx():
         if obj.TypeName == "Fem::FemMeshObject":
@@ -160,58 +88,75 @@ def main(): # {{{
     # if there is nothing selected, raise an error
     if len(mesh_objects_selected) == 0:
         raise ValueError("No mesh entities selected.")
+    return mesh_objects_selected
+# }}}
 
-    [E2N, E2T, nodes] = get_E2N_nodes_and_E2T(mesh_objects_selected)
+def main(): # {{{
+    # get all the nodes near the point I hard code here
+    x = 12.7
+    y = 12.7
+    z = 0.0
 
-    nodes_to_mpc = get_nodes_within_tolerance(nodes, R, x, y, z)
+    # set MPC creation tolerance
+    R = 25.4 * 0.125
+
+    # get mesh that's clicked on
+    mesh = get_combined_mesh(get_selected_FemMeshes())
+
+    nodes_to_mpc = get_nodes_within_tolerance(mesh, R, x, y, z)
 
     if len(nodes_to_mpc) == 0:
         print("No nodes within ",R ," units of [",x,",",y,",",z,"]")
         return
 
-    # determine how many lines the RBE3 card would have to be
-    if len(nodes_to_mpc) < 3:
-        n_rbe3_card_lines = 1
-    else:
-        n_rbe3_card_lines = 1 + math.ceil((len(nodes_to_mpc)-2)/8)
-
     # making grid ID that we'll be using as the central node
-    NID_mpc_start = max(list(nodes.keys())) + 1
-    print("GRID,"+str(NID_mpc_start)+",,"+f'{x:.3},{y:.3},{z:.3}')
+    NID_mpc_start = int(mesh.NIDs.max()) + 1
+    print(get_GRID_lines(np.array([NID_mpc_start]), np.array([[x, y, z]]),
+                         'free')[0])
 
     # getting highest EID
-    EID_mpc_start = max(list(E2N.keys())) + 1
+    EID_mpc_start = int(mesh.EIDs.max()) + 1
 
     # making rbe3 card string set
-    RBE3_line1_string = "RBE3,"
-    RBE3_line1_string += str(EID_mpc_start)+",,"
-    RBE3_line1_string += str(NID_mpc_start)+","
-    RBE3_line1_string += "123456,1.0,123,"
-    if len(nodes_to_mpc) >= 1:
-        RBE3_line1_string += str(nodes_to_mpc[0])+","
-    if len(nodes_to_mpc) >= 2:
-        RBE3_line1_string += str(nodes_to_mpc[1])
-    if n_rbe3_card_lines == 1:
-        print(RBE3_line1_string)
-        return
-    RBE3_lines = []
-    RBE3_lines.append(RBE3_line1_string)
-    nodes_in_line = 0
-    construction = ""
-    for i in range(len(nodes_to_mpc)-2):
-        NID = nodes_to_mpc[i+2]
-        construction += "," + str(NID)
-        nodes_in_line += 1
-        if nodes_in_line == 8:
-            RBE3_lines.append(construction)
-            nodes_in_line = 0
-            construction = ""
-        elif i+1 == len(nodes_to_mpc)-2:
-            RBE3_lines.append(construction)
-    for l in RBE3_lines:
+    for l in get_RBE3_lines(EID_mpc_start, NID_mpc_start, nodes_to_mpc):
         print(l)
 # }}}
 
+def main_batch(fastener_filename=None, include_filename=None): # {{{
+    """ RBE3 at every fastener of a CSV (x, y, z, R per line), all written to
+    one include file
+    Asks for the files if they aren't given.
+    - [X] 2026.10.17 | one spatial index and one ball query for every
+          fastener, cards streamed to the include file
+    """
+    from PySide import QtGui
+    if fastener_filename is None:
+        fastener_filename, _ = QtGui.QFileDialog.getOpenFileName(
+            None,
+            'Open Fastener File',
+            '',
+            "Comma Separated Values (*.csv *.txt)"
+        )
+    if include_filename is None:
+        include_filename, _ = QtGui.QFileDialog.getSaveFileName(
+            None,
+            'Save Include File As',
+            'rbe3s.inc',
+            "Nastran Include Files (*.inc *.bdf *.nas *.dat)"
+        )
+    if fastener_filename == "" or include_filename == "":
+        return
+    mesh = get_combined_mesh(get_selected_FemMeshes())
+    [centers, radii] = read_fastener_csv(fastener_filename)
+    [NIDs_ref, EIDs] = write_RBE3_include(include_filename, mesh, centers,
+                                          radii)
+    is_skipped = NIDs_ref == -1
+    radii = np.broadcast_to(radii, len(centers))
+    for i in np.flatnonzero(is_skipped).tolist():
+        print("No nodes within ", radii[i], " units of ", centers[i].tolist())
+    print(int(np.sum(~is_skipped)), "RBE3s written to", include_filename)
+# }}}
+
 if __name__ == '__main__':
     main()
 
@@ -0,0 +1,469 @@
+from collections import namedtuple
+import numpy as np
+
+# One group of elements sharing an element type (see E2T Specification)
+#   EIDs : element IDs, sorted ascending, shape (n,)
+#   E2N  : node *indices* into MeshArrays.NIDs, shape (n, nodes per element)
+#   PIDs : property ID of each element, shape (n,)
+ElementBlock = namedtuple('ElementBlock', 'EIDs E2N PIDs')
+
+# salome node order --> nastran node order, for types that need it
+SALOME_TO_NASTRAN = {
+    7: [6, 7, 4, 5, 2, 3, 0, 1],            # CHEXA 8
+    19: [3, 2, 0, 1, 9, 6, 7, 8, 5, 4],     # CTETRA 10
+}
+
+# shell element types, and how many corner nodes they have
+SHELL_CORNERS = {15: 4, 16: 4, 18: 4, 20: 3, 21: 3}
+
+def get_index_dtype(N): # {{{
+    """ Smallest signed integer type able to index N entries
+    """
+    if N < 2**31:
+        return np.int32
+    return np.int64
+# }}}
+
+def get_element_normals(coords, E2N): # {{{
+    """ Compute unit normal vectors of many shell elements at once
+    coords : node locations, shape (N, 3)
+    E2N    : corner node indices into coords, shape (n, 3) or (n, 4)
+    Every corner contributes the cross product of its two adjacent edges,
+    which are summed (same as the old per element CQUAD4 loop) and then
+    normalized. Returns [normals, is_degenerate], where degenerate elements
+    (zero area, collapsed, or non-finite coordinates) get a [0, 0, 0] normal
+    instead of a divide by zero.
+    """
+    E2N = np.asarray(E2N)
+    P = coords[E2N]                         # corner points, (n, k, 3)
+    V = np.roll(P, -1, axis=1) - P          # edge vectors V12, V23, ...
+    NV = np.cross(V, np.roll(V, -1, axis=1)).sum(axis=1)
+    mag = np.sqrt(np.einsum('ij,ij->i', NV, NV))
+    # relative to the element size, so tiny elements aren't flagged
+    scale = np.einsum('ijk,ijk->i', V, V)
+    is_degenerate = ~(mag > 1e-12 * scale)  # also catches nan
+    normals = np.zeros_like(NV)
+    np.divide(NV, mag[:, None], out=normals, where=~is_degenerate[:, None])
+    return [normals, is_degenerate]
+# }}}
+
+def get_N2E_csr(E2N, N_nodes): # {{{
+    """ Node to element adjacency in compressed sparse row form
+    E2N     : node indices of each element, shape (n, k), or a list of such
+              arrays (one per element block, numbered one after the other).
+              Negative entries are padding for elements with fewer nodes.
+    N_nodes : number of nodes the indices point into
+    Returns [offsets, elements]. The elements touching node i are
+    elements[offsets[i]:offsets[i+1]], as row indices into E2N, ascending.
+    Built with one sort and one bincount, no per node python lists.
+    """
+    if not isinstance(E2N, (list, tuple)):
+        E2N = [E2N]
+    flat_nodes = []
+    flat_elements = []
+    N_elements = 0
+    for block in E2N:
+        block = np.asarray(block)
+        N_rows, N_cols = block.shape
+        flat_nodes.append(block.reshape(-1))
+        rows = np.arange(N_elements, N_elements + N_rows)
+        flat_elements.append(np.repeat(rows, N_cols))
+        N_elements += N_rows
+    dtype = get_index_dtype(max(N_elements, N_nodes))
+    if len(flat_nodes) == 0:
+        return [np.zeros(N_nodes + 1, dtype=np.int64), np.zeros(0, dtype)]
+    flat_nodes = np.concatenate(flat_nodes)
+    flat_elements = np.concatenate(flat_elements).astype(dtype)
+    if np.any(flat_nodes < 0):
+        is_node = flat_nodes >= 0
+        flat_nodes = flat_nodes[is_node]
+        flat_elements = flat_elements[is_node]
+    order = np.argsort(flat_nodes, kind='stable')
+    counts = np.bincount(flat_nodes, minlength=N_nodes)
+    offsets = np.zeros(N_nodes + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return [offsets, flat_elements[order]]
+# }}}
+
+def get_nodal_sum(values, offsets, elements): # {{{
+    """ Sum per element values onto the nodes with a CSR adjacency
+    values : one row per element, shape (n,) or (n, m)
+    Returns one row per node; nodes without elements get zeros.
+    """
+    values = np.asarray(values)
+    N_nodes = len(offsets) - 1
+    summed = np.zeros((N_nodes,) + values.shape[1:], dtype=values.dtype)
+    # reduceat doesn't give zeros for empty segments, so leave them out
+    has_elements = offsets[1:] > offsets[:-1]
+    if np.any(has_elements):
+        starts = offsets[:-1][has_elements]
+        summed[has_elements] = np.add.reduceat(values[elements], starts)
+    return summed
+# }}}
+
+def get_nodal_normals(element_normals, offsets, elements, feature_angle=None): # {{{
+    """ Average element normals onto the nodes, for the whole mesh at once
+    element_normals : unit normal of every element, shape (n, 3)
+    offsets, elements : CSR node to element adjacency from get_N2E_csr
+    feature_angle : optional, in degrees. If given, normals are split at
+        sharp creases: every corner (every entry of elements) only averages
+        the elements at its node within feature_angle of its own element.
+    Returns [normals, is_degenerate]
+        normals has one row per node, or one row per entry of elements when
+        feature_angle is given.
+        Where the averaged normals cancel out, the normal of the first
+        element at that node is used instead and is_degenerate is set. Nodes
+        without any (non degenerate) elements get [0, 0, 0].
+    """
+    element_normals = np.asarray(element_normals, dtype=np.float64)
+    counts = np.diff(offsets)
+    if feature_angle is None:
+        summed = get_nodal_sum(element_normals, offsets, elements)
+        # fall back on the first element at each node
+        fallback = np.zeros_like(summed)
+        has_elements = counts > 0
+        first = elements[offsets[:-1][has_elements]]
+        fallback[has_elements] = element_normals[first]
+    else:
+        # pair every corner with every other corner at the same node
+        node_of_entry = np.repeat(np.arange(len(counts)), counts)
+        reps = counts[node_of_entry]
+        run_starts = np.cumsum(reps) - reps
+        first = np.repeat(np.arange(len(elements)), reps)
+        within = np.arange(len(first)) - np.repeat(run_starts, reps)
+        partner = offsets[node_of_entry[first]] + within
+        N_first = element_normals[elements[first]]
+        N_partner = element_normals[elements[partner]]
+        cos_angle = np.einsum('ij,ij->i', N_first, N_partner)
+        is_smooth = cos_angle >= np.cos(np.radians(feature_angle))
+        summed = np.zeros((len(elements), 3))
+        if len(first) > 0:
+            summed = np.add.reduceat(N_partner * is_smooth[:, None],
+                                     run_starts)
+        # every corner sees its own element, so that's the fallback
+        fallback = element_normals[elements]
+    mag = np.sqrt(np.einsum('ij,ij->i', summed, summed))
+    scale = np.sqrt(np.einsum('ij,ij->i', fallback, fallback))
+    is_degenerate = ~(mag > 1e-12 * np.maximum(scale, 1.0))
+    normals = np.where(is_degenerate[:, None], fallback, summed)
+    mag = np.where(is_degenerate, scale, mag)
+    np.divide(normals, mag[:, None], out=normals, where=mag[:, None] > 0)
+    return [normals, is_degenerate]
+# }}}
+
+class MeshArrays: # {{{
+    """ Compact, array backed replacement for the nodes/E2N/E2T/E2P/P2M dicts
+    NIDs   : sorted node IDs, int64, shape (N,)
+    coords : contiguous node locations, float64, shape (N, 3)
+    blocks : {element type ID: ElementBlock}
+    P2M    : {PID: MID} (there are only ever a handful, a dict is fine)
+    """
+    def __init__(self, NIDs, coords, blocks=None, P2M=None): # {{{
+        NIDs = np.asarray(NIDs, dtype=np.int64).reshape(-1)
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 3)
+        if len(NIDs) != len(coords):
+            raise ValueError("NIDs and coords have different lengths")
+        order = np.argsort(NIDs, kind='stable')
+        self.NIDs = NIDs[order]
+        self.coords = np.ascontiguousarray(coords[order])
+        if len(self.NIDs) > 1 and np.any(self.NIDs[1:] == self.NIDs[:-1]):
+            raise ValueError("Duplicate node IDs passed into MeshArrays")
+        self.blocks = {}
+        if blocks is not None:
+            for e_type in sorted(blocks):
+                self.blocks[e_type] = blocks[e_type]
+        self.P2M = {} if P2M is None else dict(P2M)
+    # }}}
+
+    @property
+    def N_nodes(self): # {{{
+        return len(self.NIDs)
+    # }}}
+
+    @property
+    def N_elements(self): # {{{
+        return sum(len(block.EIDs) for block in self.blocks.values())
+    # }}}
+
+    @property
+    def EIDs(self): # {{{
+        """ Element IDs of all blocks, one after the other in block order
+        """
+        if len(self.blocks) == 0:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate([b.EIDs for b in self.blocks.values()])
+    # }}}
+
+    def node_index(self, NIDs): # {{{
+        """ Map node IDs to row indices of coords with a binary search
+        Raises ValueError if any of the node IDs aren't in the mesh.
+        """
+        NIDs = np.asarray(NIDs, dtype=np.int64)
+        index = np.searchsorted(self.NIDs, NIDs)
+        index_clipped = np.minimum(index, max(len(self.NIDs) - 1, 0))
+        if NIDs.size > 0 and (len(self.NIDs) == 0 or
+                              np.any(self.NIDs[index_clipped] != NIDs)):
+            raise ValueError("Node IDs referenced that aren't in the mesh")
+        return index.astype(get_index_dtype(len(self.NIDs)))
+    # }}}
+
+    def add_block(self, e_type, EIDs, E2N_NIDs, PIDs): # {{{
+        """ Add elements of one type, with connectivity given as node IDs
+        """
+        EIDs = np.asarray(EIDs, dtype=np.int64).reshape(-1)
+        E2N_NIDs = np.asarray(E2N_NIDs, dtype=np.int64)
+        E2N_NIDs = E2N_NIDs.reshape(len(EIDs), -1)
+        PIDs = np.broadcast_to(np.asarray(PIDs, dtype=np.int64), EIDs.shape)
+        if e_type in self.blocks:
+            old = self.blocks[e_type]
+            if old.E2N.shape[1] != E2N_NIDs.shape[1]:
+                s = "Element type " + str(e_type) + " has mixed node counts"
+                raise ValueError(s)
+            EIDs = np.concatenate((old.EIDs, EIDs))
+            E2N_NIDs = np.concatenate((self.NIDs[old.E2N], E2N_NIDs))
+            PIDs = np.concatenate((old.PIDs, PIDs))
+        order = np.argsort(EIDs, kind='stable')
+        block = ElementBlock(EIDs[order],
+                             self.node_index(E2N_NIDs[order]),
+                             np.array(PIDs[order]))
+        self.blocks[e_type] = block
+        self.blocks = dict(sorted(self.blocks.items()))
+    # }}}
+
+    def get_E2N_NIDs(self, e_type): # {{{
+        """ Connectivity of one element type as node IDs instead of indices
+        """
+        return self.NIDs[self.blocks[e_type].E2N]
+    # }}}
+
+    def drop_unreferenced_nodes(self): # {{{
+        """ Copy of the mesh without the nodes no element references
+        Nodes keep their order, so the connectivity only shifts down by the
+        number of dropped nodes before it, with no ID lookups.
+        """
+        is_used = np.zeros(self.N_nodes, dtype=bool)
+        for block in self.blocks.values():
+            is_used[block.E2N.reshape(-1)] = True
+        new_index = np.cumsum(is_used) - 1
+        blocks = {}
+        for e_type, block in self.blocks.items():
+            E2N = new_index[block.E2N].astype(block.E2N.dtype)
+            blocks[e_type] = ElementBlock(block.EIDs, E2N, block.PIDs)
+        return MeshArrays(self.NIDs[is_used], self.coords[is_used],
+                          blocks=blocks, P2M=self.P2M)
+    # }}}
+
+    def get_N2E_csr(self): # {{{
+        """ Node to element adjacency over all blocks, see get_N2E_csr
+        Element indices line up with the EIDs property.
+        """
+        E2N = [block.E2N for block in self.blocks.values()]
+        return get_N2E_csr(E2N, self.N_nodes)
+    # }}}
+
+    def get_element_normals(self): # {{{
+        """ Unit normals of every shell element block
+        Returns {element type ID: [normals, is_degenerate]}, with rows lined
+        up with that block's EIDs. Non shell blocks are left out.
+        """
+        normals = {}
+        for e_type, block in self.blocks.items():
+            if e_type in SHELL_CORNERS:
+                corners = block.E2N[:, :SHELL_CORNERS[e_type]]
+                normals[e_type] = get_element_normals(self.coords, corners)
+        return normals
+    # }}}
+
+    def get_nodal_normals(self, feature_angle=None): # {{{
+        """ Nodal normals of the shell elements, see get_nodal_normals
+        Returns [normals, is_degenerate, offsets, elements], where the CSR
+        adjacency only covers the shell blocks, with element indices lined
+        up with the shell blocks' EIDs one after the other.
+        """
+        E2N = []
+        element_normals = []
+        for e_type, [normals, _] in self.get_element_normals().items():
+            E2N.append(self.blocks[e_type].E2N[:, :SHELL_CORNERS[e_type]])
+            element_normals.append(normals)
+        [offsets, elements] = get_N2E_csr(E2N, self.N_nodes)
+        if len(element_normals) == 0:
+            element_normals = np.zeros((0, 3))
+        else:
+            element_normals = np.concatenate(element_normals)
+        [normals, is_degenerate] = get_nodal_normals(element_normals, offsets,
+                                                     elements, feature_angle)
+        return [normals, is_degenerate, offsets, elements]
+    # }}}
+
+    @classmethod
+    def from_dicts(cls, nodes, E2N, E2T, E2P=None, P2M=None): # {{{
+        """ Build from the legacy {NID: [x, y, z]}, {EID: [N1, ...]} dicts
+        If E2P isn't given, every element gets property ID 0.
+        """
+        NIDs = np.fromiter(nodes.keys(), dtype=np.int64, count=len(nodes))
+        coords = np.array(list(nodes.values()), dtype=np.float64)
+        mesh = cls(NIDs, coords.reshape(-1, 3), P2M=P2M)
+        # bucket the elements by type, then add each bucket in one go
+        buckets = {}
+        for EID, NIDs_in_elm in E2N.items():
+            e_type = E2T[EID]
+            PID = 0 if E2P is None else E2P[EID]
+            if e_type not in buckets:
+                buckets[e_type] = ([], [], [])
+            buckets[e_type][0].append(EID)
+            buckets[e_type][1].append(NIDs_in_elm)
+            buckets[e_type][2].append(PID)
+        for e_type, (EIDs, E2N_NIDs, PIDs) in buckets.items():
+            if len(set(len(n) for n in E2N_NIDs)) != 1:
+                s = "Element type " + str(e_type) + " has mixed node counts"
+                raise ValueError(s)
+            mesh.add_block(e_type, EIDs, E2N_NIDs, PIDs)
+        return mesh
+    # }}}
+
+    @classmethod
+    def from_FemMesh(cls, mesh): # {{{
+        """ Build from a FreeCAD FemMesh, numbering like get_data_from_mesh_objects
+        - elements are numbered 1..N in the order TRIA3, QUAD4, HEXA8, TETRA10
+        - each element type gets its own property and material ID
+        - salome node ordering is converted to nastran node ordering
+        """
+        return cls.from_FemMesh_contents(*read_FemMesh(mesh))
+    # }}}
+
+    @classmethod
+    def from_FemMesh_contents(cls, NIDs, coords, buckets): # {{{
+        """ Build from what read_FemMesh pulled out of a FemMesh
+        Only numpy work from here on; nothing touches FreeCAD.
+        """
+        NIDs = np.asarray(NIDs, dtype=np.int64)
+        coords = np.array(coords, dtype=np.float64).reshape(-1, 3)
+        data = cls(NIDs, coords)
+        # number the elements, properties and materials per type
+        EID = 0     # highest element ID so far
+        PID = 0     # highest property ID so far
+        for e_type in [20, 15, 7, 19]:
+            if len(buckets[e_type]) == 0:
+                continue
+            E2N_NIDs = np.array(buckets[e_type], dtype=np.int64)
+            if e_type in SALOME_TO_NASTRAN:
+                E2N_NIDs = E2N_NIDs[:, SALOME_TO_NASTRAN[e_type]]
+            # same (odd) rule as before: PID from the highest EID so far,
+            # and MID from the highest PID so far
+            MID = PID + 1
+            PID = EID + 1
+            EIDs = np.arange(EID + 1, EID + 1 + len(E2N_NIDs))
+            data.add_block(e_type, EIDs, E2N_NIDs, PID)
+            data.P2M[PID] = MID
+            EID = EIDs[-1]
+        return data
+    # }}}
+
+    def to_FemMesh(self): # {{{
+        """ Make a FreeCAD FemMesh out of it, putting back salome ordering
+        One addNode per node and one addFace/addVolume per element, with
+        the arrays turned into lists up front and the bound methods looked
+        up once.
+        """
+        import Fem
+        fem_mesh = Fem.FemMesh()
+        add_node = fem_mesh.addNode
+        for NID, [x, y, z] in zip(self.NIDs.tolist(), self.coords.tolist()):
+            add_node(x, y, z, NID)
+        for e_type, block in self.blocks.items():
+            E2N_NIDs = self.get_E2N_NIDs(e_type)
+            if e_type in SALOME_TO_NASTRAN:
+                E2N_NIDs = E2N_NIDs[:, np.argsort(SALOME_TO_NASTRAN[e_type])]
+            if e_type in SHELL_CORNERS:
+                add_element = fem_mesh.addFace
+            else:
+                add_element = fem_mesh.addVolume
+            for EID, NIDs_in_elm in zip(block.EIDs.tolist(),
+                                        E2N_NIDs.tolist()):
+                add_element(NIDs_in_elm, EID)
+        return fem_mesh
+    # }}}
+
+    def to_dicts(self): # {{{
+        """ Return the legacy dict data structures, keyed like 'data' entries
+        {'nodes': nodes, 'E2N': E2N, 'E2T': E2T, 'E2P': E2P, 'P2M': P2M}
+        Elements are inserted in ascending element ID order.
+        """
+        nodes = dict(zip(self.NIDs.tolist(), self.coords.tolist()))
+        EIDs = []
+        rows = []
+        types = []
+        PIDs = []
+        for e_type, block in self.blocks.items():
+            EIDs.extend(block.EIDs.tolist())
+            rows.extend(self.NIDs[block.E2N].tolist())
+            types.extend([e_type] * len(block.EIDs))
+            PIDs.extend(block.PIDs.tolist())
+        order = np.argsort(np.array(EIDs, dtype=np.int64), kind='stable')
+        E2N = {}
+        E2T = {}
+        E2P = {}
+        for i in order.tolist():
+            E2N[EIDs[i]] = rows[i]
+            E2T[EIDs[i]] = types[i]
+            E2P[EIDs[i]] = PIDs[i]
+        return {'nodes': nodes, 'E2N': E2N, 'E2T': E2T, 'E2P': E2P,
+                'P2M': dict(self.P2M)}
+    # }}}
+# }}}
+
+def read_FemMesh(mesh): # {{{
+    """ Pull the nodes and connectivity out of a FreeCAD FemMesh
+    Every FemMesh call MeshArrays.from_FemMesh makes is made here; the rest
+    is plain numpy (see MeshArrays.from_FemMesh_contents).
+    Returns [NIDs, coords, buckets]: node IDs, [x, y, z] of each node, and
+    {element type ID: list of salome ordered node IDs of each element}.
+    """
+    # Nodes returns every node in one call, rather than one per getNodeById
+    node_dict = mesh.Nodes
+    NIDs = list(node_dict.keys())
+    coords = [tuple(v) for v in node_dict.values()]
+    if mesh.EdgeCount != 0:
+        s = "Edges not supported as of 2021.10.16"
+        print(s)
+    if mesh.PyramidCount != 0:
+        s = "Pyramids not supported as of 2021.10.16"
+        raise ValueError(s)
+    if mesh.PrismCount != 0:
+        s = "Prisms not supported as of 2021.10.16"
+        raise ValueError(s)
+
+    # gather connectivity of every element, bucketed by type
+    # (there's no bulk call for connectivity, so keep the loop tight)
+    get_element_nodes = mesh.getElementNodes
+    buckets = {20: [], 15: [], 7: [], 19: []}
+    if mesh.TriangleCount != 0 or mesh.QuadrangleCount != 0:
+        faces = [get_element_nodes(face) for face in mesh.Faces]
+        buckets[20] = [f for f in faces if len(f) == 3]
+        buckets[15] = [f for f in faces if len(f) == 4]
+    if mesh.HexaCount != 0 or mesh.TetraCount != 0:
+        volumes = [get_element_nodes(volume) for volume in mesh.Volumes]
+        for NIDs_in_elm in volumes:
+            if len(NIDs_in_elm) not in (8, 10):
+                if mesh.HexaCount != 0:
+                    s = "As of 2021.10.17, CHEXA 20 elements are not supported."
+                else:
+                    s = "As of 2021.10.17, CTETRA 4 elements are not supported."
+                raise ValueError(s)
+        buckets[7] = [v for v in volumes if len(v) == 8]
+        buckets[19] = [v for v in volumes if len(v) == 10]
+    return [NIDs, coords, buckets]
+# }}}
+
+def get_MeshArrays_from_FemMeshes(meshes, to_dicts=False): # {{{
+    """ MeshArrays.from_FemMesh of many meshes, in the same order as meshes
+    FreeCAD's FemMesh isn't documented as thread safe, so the meshes are
+    read and built one after another on the calling thread.
+    to_dicts: return each mesh as the legacy dicts (see to_dicts) instead
+    """
+    data = []
+    for mesh in meshes:
+        mesh_arrays = MeshArrays.from_FemMesh(mesh)
+        data.append(mesh_arrays.to_dicts() if to_dicts else mesh_arrays)
+    return data
+# }}}
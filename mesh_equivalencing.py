@@ -0,0 +1,268 @@
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import cKDTree
+from mesh_arrays import MeshArrays
+from mesh_renumbering import NodeReplacements
+from spatial_index import get_spatial_index
+
+def get_coincident_pairs(coords, eq_tol): # {{{
+    """ Index pairs of nodes closer together than eq_tol, shape (N_pairs, 2)
+    """
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 3)
+    if len(coords) < 2:
+        return np.zeros((0, 2), dtype=np.int64)
+    tree = cKDTree(coords)
+    return tree.query_pairs(eq_tol, output_type='ndarray')
+# }}}
+
+def get_node_clusters(N_nodes, pairs): # {{{
+    """ Label each node with the cluster of coincident nodes it's in
+    Clusters are the connected components of the graph of pairs, so chains
+    (A near B, B near C) end up in one cluster even if A and C are apart.
+    Returns [N_clusters, labels], labels having shape (N_nodes,).
+    """
+    pairs = np.asarray(pairs).reshape(-1, 2)
+    ones = np.ones(len(pairs), dtype=np.int8)
+    graph = coo_matrix((ones, (pairs[:, 0], pairs[:, 1])),
+                       shape=(N_nodes, N_nodes))
+    [N_clusters, labels] = connected_components(graph, directed=False)
+    return [N_clusters, labels]
+# }}}
+
+def get_part_respecting_clusters(pairs, part_of, distances): # {{{
+    """ Like get_node_clusters, but never with two nodes of one part in a
+    cluster
+    pairs     : index pairs of nodes in different parts, shape (N_pairs, 2)
+    part_of   : part of each node, shape (N_nodes,)
+    distances : length of each pair, shape (N_pairs,)
+    Clusters are connected components, as in get_node_clusters, except
+    where a chain of pairs (A of part 0 near B of part 1 near C of part 0)
+    would put two nodes of one part together. Those clusters are built again
+    from their own pairs, closest first, skipping any pair that would join
+    two groups holding a node of the same part.
+    Returns [N_clusters, labels], labels having shape (N_nodes,).
+    """
+    part_of = np.asarray(part_of)
+    [N_clusters, labels] = get_node_clusters(len(part_of), pairs)
+    order = np.lexsort((part_of, labels))
+    is_repeat = (labels[order][1:] == labels[order][:-1]) & \
+        (part_of[order][1:] == part_of[order][:-1])
+    bad_clusters = np.unique(labels[order][1:][is_repeat])
+    if len(bad_clusters) == 0:
+        return [N_clusters, labels]
+
+    # union find over the nodes of the clusters that need splitting
+    is_bad_pair = np.isin(labels[pairs[:, 0]], bad_clusters)
+    bad_pairs = pairs[is_bad_pair]
+    pair_order = np.lexsort((bad_pairs[:, 1], bad_pairs[:, 0],
+                             distances[is_bad_pair]))
+    bad_nodes = np.flatnonzero(np.isin(labels, bad_clusters))
+    parent = dict((i, i) for i in bad_nodes.tolist())
+    parts_in = dict((i, set([p])) for i, p in
+                    zip(bad_nodes.tolist(), part_of[bad_nodes].tolist()))
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    for [i, j] in bad_pairs[pair_order].tolist():
+        [root_i, root_j] = [find(i), find(j)]
+        if root_i == root_j or not parts_in[root_i].isdisjoint(parts_in[root_j]):
+            continue
+        parent[root_j] = root_i
+        parts_in[root_i] |= parts_in.pop(root_j)
+
+    # the split clusters get labels past the others, then renumber 0..N-1
+    labels = labels.copy()
+    roots = np.fromiter((find(i) for i in bad_nodes.tolist()), dtype=np.int64,
+                        count=len(bad_nodes))
+    labels[bad_nodes] = N_clusters + roots
+    [unique_labels, labels] = np.unique(labels, return_inverse=True)
+    return [len(unique_labels), labels.reshape(-1)]
+# }}}
+
+def get_equivalence_map(NIDs, coords, eq_tol, pairs=None): # {{{
+    """ New node ID of every node, after collapsing coincident nodes
+    Each cluster of coincident nodes takes the lowest node ID in it.
+    pairs: index pairs of coincident nodes, if already found
+    Returns new_NIDs, lined up with NIDs; untouched nodes keep their ID.
+    """
+    NIDs = np.asarray(NIDs, dtype=np.int64).reshape(-1)
+    if pairs is None:
+        pairs = get_coincident_pairs(coords, eq_tol)
+    if len(pairs) == 0:
+        return NIDs.copy()
+    [N_clusters, labels] = get_node_clusters(len(NIDs), pairs)
+    # sort by cluster, then by ID, so the first of each cluster is its lowest
+    order = np.lexsort((NIDs, labels))
+    is_first = np.ones(len(order), dtype=bool)
+    is_first[1:] = labels[order][1:] != labels[order][:-1]
+    lowest_NID = np.empty(N_clusters, dtype=np.int64)
+    lowest_NID[labels[order][is_first]] = NIDs[order][is_first]
+    return lowest_NID[labels]
+# }}}
+
+def get_collapsed_elements(E2N_NIDs): # {{{
+    """ True for each element that references the same node more than once
+    """
+    E2N_NIDs = np.sort(np.asarray(E2N_NIDs), axis=1)
+    return np.any(E2N_NIDs[:, 1:] == E2N_NIDs[:, :-1], axis=1)
+# }}}
+
+def equivalence_MeshArrays(mesh, eq_tol): # {{{
+    """ Collapse nodes of a MeshArrays that are within eq_tol of each other
+    Returns [equivalenced, new_NIDs, collapsed]
+    equivalenced : MeshArrays with one node left per cluster (the lowest ID,
+                   at its own location) and connectivity remapped to it
+    new_NIDs     : new node ID of every node in mesh, lined up with mesh.NIDs
+    collapsed    : {element type ID: EIDs} of elements that would reference
+                   a node twice, which are left out of equivalenced
+    The mesh's cached spatial index is used, so trying one tolerance after
+    another doesn't rebuild the tree.
+    """
+    pairs = mesh.node_index(get_spatial_index(mesh).query_pairs(eq_tol))
+    new_NIDs = get_equivalence_map(mesh.NIDs, mesh.coords, eq_tol, pairs)
+    keep = new_NIDs == mesh.NIDs
+    equivalenced = MeshArrays(mesh.NIDs[keep], mesh.coords[keep],
+                              P2M=mesh.P2M)
+    collapsed = {}
+    for e_type, block in mesh.blocks.items():
+        # E2N holds indices into mesh.NIDs, which new_NIDs lines up with
+        E2N_NIDs = new_NIDs[block.E2N]
+        is_collapsed = get_collapsed_elements(E2N_NIDs)
+        if np.any(is_collapsed):
+            collapsed[e_type] = block.EIDs[is_collapsed]
+        ok = ~is_collapsed
+        if not np.any(ok):
+            continue
+        equivalenced.add_block(e_type, block.EIDs[ok], E2N_NIDs[ok],
+                               block.PIDs[ok])
+    return [equivalenced, new_NIDs, collapsed]
+# }}}
+
+def get_cross_part_pairs(parts, eq_tol): # {{{
+    """ Pairs of nodes within eq_tol of each other that are in different parts
+    One tree per part (each part's cached spatial index); each pair of parts
+    whose bounding boxes come within eq_tol of each other is queried tree
+    against tree, so nodes are never matched within a part.
+    Returns an (N_pairs, 2) array of indices into the parts' nodes, one after
+    the other in parts order.
+    """
+    offsets = np.cumsum([0] + [part.N_nodes for part in parts])
+    indices = [get_spatial_index(part) for part in parts]
+    lower = [part.coords.min(axis=0) - eq_tol if part.N_nodes > 0 else None
+             for part in parts]
+    upper = [part.coords.max(axis=0) + eq_tol if part.N_nodes > 0 else None
+             for part in parts]
+    pairs = [np.zeros((0, 2), dtype=np.int64)]
+    for i in range(len(parts)):
+        for j in range(i + 1, len(parts)):
+            if parts[i].N_nodes == 0 or parts[j].N_nodes == 0:
+                continue
+            if np.any(lower[i] > upper[j]) or np.any(lower[j] > upper[i]):
+                continue
+            matches = indices[i].query_pairs_with(indices[j], eq_tol)
+            pairs.append(np.column_stack(
+                (parts[i].node_index(matches[:, 0]) + offsets[i],
+                 parts[j].node_index(matches[:, 1]) + offsets[j])))
+    return np.concatenate(pairs).astype(np.int64)
+# }}}
+
+def get_cross_part_replacements(parts, eq_tol): # {{{
+    """ Glue parts at coincident nodes without renumbering anything else
+    Nodes of different parts within eq_tol of each other (chained, like
+    get_node_clusters) all take the lowest node ID among them, the first
+    part winning ties. Every other node keeps its ID, and nodes within one
+    part are never merged with each other, even through a node of another
+    part near both (see get_part_respecting_clusters).
+    Returns a NodeReplacements table with a row for every node that gives
+    way to another: connectivity should use new_NIDs in its place, and its
+    own GRID is dropped.
+    """
+    parts = list(parts)
+    pairs = get_cross_part_pairs(parts, eq_tol)
+    empty = np.zeros(0, dtype=np.int64)
+    if len(pairs) == 0:
+        return NodeReplacements(empty, empty, empty)
+    NIDs = np.concatenate([part.NIDs for part in parts])
+    coords = np.concatenate([part.coords for part in parts])
+    part_of = np.repeat(np.arange(len(parts)), [p.N_nodes for p in parts])
+    distances = np.linalg.norm(coords[pairs[:, 0]] - coords[pairs[:, 1]],
+                               axis=1)
+    # only nodes that are in a pair need looking at
+    [members, pairs] = np.unique(pairs, return_inverse=True)
+    pairs = pairs.reshape(-1, 2)
+    [N_clusters, labels] = get_part_respecting_clusters(
+        pairs, part_of[members], distances)
+    # the first of each cluster, by ID then part, is the one that stays
+    order = np.lexsort((part_of[members], NIDs[members], labels))
+    is_first = np.ones(len(order), dtype=bool)
+    is_first[1:] = labels[order][1:] != labels[order][:-1]
+    kept_NID = np.empty(N_clusters, dtype=np.int64)
+    kept_NID[labels[order][is_first]] = NIDs[members][order][is_first]
+    gives_way = members[order][~is_first]
+    new_NIDs = kept_NID[labels[order][~is_first]]
+    order = np.lexsort((NIDs[gives_way], part_of[gives_way]))
+    return NodeReplacements(part_of[gives_way][order],
+                            NIDs[gives_way][order], new_NIDs[order])
+# }}}
+
+def get_quad_grid(N_x, N_y, x0=0.0): # {{{
+    """ Flat grid of N_x by N_y CQUAD4s starting at x = x0, IDs from 1
+    Used by the benchmark in main.
+    """
+    [X, Y] = np.meshgrid(np.arange(N_x + 1) + x0, np.arange(N_y + 1),
+                         indexing='ij')
+    coords = np.column_stack((X.ravel(), Y.ravel(), np.zeros(X.size)))
+    NIDs = np.arange(1, len(coords) + 1)
+    [I, J] = np.meshgrid(np.arange(N_x), np.arange(N_y), indexing='ij')
+    corner = (I * (N_y + 1) + J).ravel()
+    E2N = np.column_stack((corner, corner + N_y + 1, corner + N_y + 2,
+                           corner + 1))
+    mesh = MeshArrays(NIDs, coords)
+    mesh.add_block(15, np.arange(1, len(E2N) + 1), NIDs[E2N], 1)
+    mesh.P2M[1] = 1
+    return mesh
+# }}}
+
+def main(): # {{{
+    """ Benchmark of merging and equivalencing two quad grids that share an
+    edge, at doubling sizes. Time per element should stay flat (linear).
+    Run as a script: python mesh_equivalencing.py [largest N_elements]
+    """
+    import sys
+    import time
+    from mesh_renumbering import merge_MeshArrays
+    # regression: part 1's node 10 is within tol of both of part 0's nodes,
+    # which are 0.8 apart, so only the nearer (node 1) may be glued to it
+    parts = [MeshArrays([1, 2], [[0, 0, 0], [0.8, 0, 0]]),
+             MeshArrays([10], [[0.4, 0, 0]])]
+    replacements = get_cross_part_replacements(parts, 0.5)
+    if replacements.parts.tolist() != [1] or \
+            replacements.old_NIDs.tolist() != [10] or \
+            replacements.new_NIDs.tolist() != [1]:
+        raise ValueError("nodes of one part were glued through another part")
+    N_largest = int(sys.argv[1]) if len(sys.argv) > 1 else 2**21
+    N_elms = 2**14
+    print("  elements   merge (s)   equivalence (s)   us per element")
+    while N_elms <= N_largest:
+        N_y = 64
+        N_x = N_elms // (2 * N_y)
+        parts = [get_quad_grid(N_x, N_y), get_quad_grid(N_x, N_y, N_x)]
+        start = time.perf_counter()
+        mesh = merge_MeshArrays(parts, 'compact')
+        t_merge = time.perf_counter() - start
+        start = time.perf_counter()
+        [equivalenced, new_NIDs, collapsed] = equivalence_MeshArrays(mesh, 1e-6)
+        t_equivalence = time.perf_counter() - start
+        if equivalenced.N_nodes != mesh.N_nodes - (N_y + 1):
+            raise ValueError("shared edge wasn't equivalenced")
+        us = 1e6 * (t_merge + t_equivalence) / mesh.N_elements
+        print("{:10d}  {:10.3f}  {:16.3f}  {:15.2f}".format(
+            mesh.N_elements, t_merge, t_equivalence, us))
+        N_elms *= 2
+# }}}
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+from collections import namedtuple
+import numpy as np
+from mesh_arrays import MeshArrays
+
+# Node IDs to swap out, part by part, e.g. to glue parts at coincident nodes
+#   parts    : index of the part each row applies to, sorted ascending
+#   old_NIDs : node ID in that part, sorted ascending within each part
+#   new_NIDs : node ID to use in its place (the node that stays)
+NodeReplacements = namedtuple('NodeReplacements', 'parts old_NIDs new_NIDs')
+
+# preserve: keep every ID that's still free, give colliding IDs max + 1,
+#           max + 2, ... in ascending order (what the old merge loop did)
+# offset:   shift each part past the highest ID of the parts before it
+# compact:  number everything 1..N, part by part, in ascending ID order
+RENUMBERING_POLICIES = ['preserve', 'offset', 'compact']
+
+def get_preserved_IDs(IDs, used_IDs): # {{{
+    """ New IDs for one part under the 'preserve' policy
+    IDs      : sorted, unique IDs of the part
+    used_IDs : sorted, unique IDs already taken by earlier parts
+    Same as walking IDs in ascending order and giving any ID that's already
+    taken max(taken) + 1, but without the walk: below the old max only
+    membership matters, and above it the IDs that collide with the block
+    of new IDs are a prefix (IDs[j] - j is non decreasing).
+    """
+    IDs = np.asarray(IDs, dtype=np.int64)
+    new_IDs = IDs.copy()
+    if len(used_IDs) == 0 or len(IDs) == 0:
+        return new_IDs
+    max_used = used_IDs[-1]
+    is_low = IDs <= max_used
+    index = np.searchsorted(used_IDs, IDs[is_low]).clip(max=len(used_IDs)-1)
+    collides = np.zeros(len(IDs), dtype=bool)
+    collides[is_low] = used_IDs[index] == IDs[is_low]
+    N_low_collisions = int(np.sum(collides))
+    high = np.flatnonzero(~is_low)
+    collides[high] = IDs[high] - np.arange(len(high)) <= \
+        max_used + N_low_collisions
+    N_collisions = int(np.sum(collides))
+    new_IDs[collides] = max_used + 1 + np.arange(N_collisions)
+    return new_IDs
+# }}}
+
+def get_ID_maps(ID_sets, policy='preserve'): # {{{
+    """ New IDs for several parts' worth of IDs, so that none are shared
+    ID_sets : list of arrays of unique IDs, one per part (any order)
+    Returns a list of arrays of new IDs, lined up with ID_sets.
+    """
+    if policy not in RENUMBERING_POLICIES:
+        s = "policy must be one of " + ", ".join(RENUMBERING_POLICIES)
+        raise ValueError(s)
+    ID_sets = [np.asarray(IDs, dtype=np.int64).reshape(-1) for IDs in ID_sets]
+    orders = [np.argsort(IDs, kind='stable') for IDs in ID_sets]
+    sorted_sets = [IDs[order] for IDs, order in zip(ID_sets, orders)]
+    for IDs in sorted_sets:
+        if len(IDs) > 1 and np.any(IDs[1:] == IDs[:-1]):
+            raise ValueError("IDs within a part must be unique")
+
+    new_sorted_sets = []
+    if policy == 'preserve':
+        used_IDs = np.zeros(0, dtype=np.int64)
+        for IDs in sorted_sets:
+            new_IDs = get_preserved_IDs(IDs, used_IDs)
+            new_sorted_sets.append(new_IDs)
+            # new IDs never collide with used ones, so this is just a merge
+            # of two sorted runs, which a stable sort does in linear time
+            used_IDs = np.concatenate((used_IDs, np.sort(new_IDs)))
+            used_IDs.sort(kind='stable')
+    elif policy == 'offset':
+        offset = 0
+        for IDs in sorted_sets:
+            new_sorted_sets.append(IDs + offset)
+            if len(IDs) > 0:
+                offset = max(offset, int(IDs[-1]) + offset)
+    else:
+        start = 1
+        for IDs in sorted_sets:
+            new_sorted_sets.append(np.arange(start, start + len(IDs)))
+            start += len(IDs)
+
+    # back into the order the IDs were given in
+    ID_maps = []
+    for order, new_IDs in zip(orders, new_sorted_sets):
+        ID_map = np.empty(len(order), dtype=np.int64)
+        ID_map[order] = new_IDs
+        ID_maps.append(ID_map)
+    return ID_maps
+# }}}
+
+def remap_IDs(old_IDs, new_IDs, values): # {{{
+    """ Replace every ID in values with its new ID, in one lookup
+    old_IDs and new_IDs line up; values can be any shape.
+    Raises ValueError if values holds IDs that aren't in old_IDs.
+    """
+    old_IDs = np.asarray(old_IDs, dtype=np.int64)
+    new_IDs = np.asarray(new_IDs, dtype=np.int64)
+    values = np.asarray(values, dtype=np.int64)
+    order = np.argsort(old_IDs, kind='stable')
+    index = np.searchsorted(old_IDs[order], values).clip(max=len(order)-1)
+    if len(order) == 0 or np.any(old_IDs[order][index] != values):
+        raise ValueError("IDs referenced that aren't in the ID map")
+    return new_IDs[order][index]
+# }}}
+
+def replace_IDs(old_IDs, new_IDs, values): # {{{
+    """ Like remap_IDs, but IDs that aren't in old_IDs are left as they are
+    old_IDs must be sorted.
+    """
+    old_IDs = np.asarray(old_IDs, dtype=np.int64)
+    values = np.array(values, dtype=np.int64)
+    if len(old_IDs) == 0:
+        return values
+    index = np.searchsorted(old_IDs, values).clip(max=len(old_IDs)-1)
+    is_replaced = old_IDs[index] == values
+    values[is_replaced] = np.asarray(new_IDs, dtype=np.int64)[index[is_replaced]]
+    return values
+# }}}
+
+def get_part_replacements(replacements, part): # {{{
+    """ [old_NIDs, new_NIDs] of one part out of a NodeReplacements table
+    old_NIDs come out sorted. No table means nothing is replaced.
+    """
+    if replacements is None:
+        return [np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)]
+    [start, end] = np.searchsorted(replacements.parts, [part, part + 1])
+    return [replacements.old_NIDs[start:end], replacements.new_NIDs[start:end]]
+# }}}
+
+def renumber_parts(parts, policy='preserve'): # {{{
+    """ Renumber several MeshArrays so that none of their IDs are shared
+    Node, element, property and material IDs are each renumbered with
+    policy (see RENUMBERING_POLICIES), and each part's connectivity,
+    property IDs and P2M are remapped with its own maps, so nothing in one
+    part can be touched by renumbering another.
+    Returns a list of new MeshArrays, lined up with parts.
+    """
+    parts = list(parts)
+    NID_maps = get_ID_maps([part.NIDs for part in parts], policy)
+    EID_maps = get_ID_maps([part.EIDs for part in parts], policy)
+    PID_sets = []
+    MID_sets = []
+    for part in parts:
+        PIDs = [block.PIDs for block in part.blocks.values()]
+        PIDs.append(np.fromiter(part.P2M.keys(), dtype=np.int64))
+        PID_sets.append(np.unique(np.concatenate(PIDs)))
+        MID_sets.append(np.unique(np.fromiter(part.P2M.values(),
+                                              dtype=np.int64)))
+    PID_maps = get_ID_maps(PID_sets, policy)
+    MID_maps = get_ID_maps(MID_sets, policy)
+
+    new_parts = []
+    for i, part in enumerate(parts):
+        new_part = MeshArrays(NID_maps[i], part.coords)
+        start = 0
+        for e_type, block in part.blocks.items():
+            N_elms = len(block.EIDs)
+            # EIDs property goes block by block, so EID_maps[i] does too
+            EIDs = EID_maps[i][start:start + N_elms]
+            start += N_elms
+            # E2N holds indices into part.NIDs, which NID_maps[i] lines up with
+            E2N_NIDs = NID_maps[i][block.E2N]
+            PIDs = remap_IDs(PID_sets[i], PID_maps[i], block.PIDs)
+            new_part.add_block(e_type, EIDs, E2N_NIDs, PIDs)
+        for PID, MID in part.P2M.items():
+            new_PID = int(remap_IDs(PID_sets[i], PID_maps[i], PID))
+            MID = int(remap_IDs(MID_sets[i], MID_maps[i], MID))
+            new_part.P2M[new_PID] = MID
+        new_parts.append(new_part)
+    return new_parts
+# }}}
+
+def merge_MeshArrays(parts, policy='preserve'): # {{{
+    """ Combine several MeshArrays into one, renumbering what collides
+    See renumber_parts for how the IDs are renumbered.
+    """
+    parts = renumber_parts(parts, policy)
+    NIDs = [part.NIDs for part in parts] + [np.zeros(0, dtype=np.int64)]
+    coords = [part.coords for part in parts] + [np.zeros((0, 3))]
+    mesh = MeshArrays(np.concatenate(NIDs), np.concatenate(coords))
+    # gather each element type over all the parts, then add it in one go
+    buckets = {}
+    for part in parts:
+        for e_type, block in part.blocks.items():
+            if e_type not in buckets:
+                buckets[e_type] = ([], [], [])
+            buckets[e_type][0].append(block.EIDs)
+            buckets[e_type][1].append(part.NIDs[block.E2N])
+            buckets[e_type][2].append(block.PIDs)
+        mesh.P2M.update(part.P2M)
+    for e_type, (EIDs, E2N_NIDs, PIDs) in buckets.items():
+        if len(set(E2N.shape[1] for E2N in E2N_NIDs)) != 1:
+            s = "Element type " + str(e_type) + " has mixed node counts"
+            raise ValueError(s)
+        mesh.add_block(e_type, np.concatenate(EIDs),
+                       np.concatenate(E2N_NIDs), np.concatenate(PIDs))
+    mesh.P2M = dict(sorted(mesh.P2M.items()))
+    return mesh
+# }}}
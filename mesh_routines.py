@@ -37,11 +37,17 @@ __date__    = '2021'
 
 # temporary icons from oxygen LGPL v3+
 
-import FreeCAD as App
-import Fem
-import Part
+# FreeCAD and Part are imported where they're used, so the array side of
+# this module loads in plain python too
+import numpy as np
+from mesh_arrays import MeshArrays
+from mesh_utilities import get_ruled_coords, get_ruled_E2N
 
-PrintMessage = App.Console.PrintMessage
+
+def PrintMessage(message):
+    """FreeCAD console message"""
+    import FreeCAD as App
+    App.Console.PrintMessage(message)
 
 
 def _points_fmt(seq):
@@ -50,6 +56,7 @@ def _points_fmt(seq):
 
 def fourpoint_warp(edge1, edge2):
     """endpoint lines with smallest distance reveals largest warp"""
+    import Part
     
     makeLine = Part.makeLine
     
@@ -114,57 +121,24 @@ def make_mesh_from_edges(sel_edges, N_elms_X, N_elms_Y, force_flip=False):
     E2N = make_elements_of_ruled_mesh(N_elms_X, N_elms_Y)
     
     # Now have E2N and Nodes array
-    # Add all of the nodes to a container called 'mesh'
-    mesh = Fem.FemMesh()
-
-    # add all of the nodes to mesh object
-    for node in nodes:
-        mesh.addNode(*node)
-    # add all of the elements to mesh object
-    for E in E2N:
-        #print(E)
-        mesh.addFace(E[1:], E[0])
+    # Add all of the nodes and elements to a container called 'mesh'
+    mesh = MeshArrays(np.arange(1, len(nodes) + 1), nodes)
+    mesh.add_block(15, np.arange(1, len(E2N) + 1), E2N, 1)
 
-    return mesh, flipped
+    return mesh.to_FemMesh(), flipped
 
 
 def make_elements_of_ruled_mesh(N_elms_X, N_elms_Y):
-    Nx = N_elms_X + 1
-    Ny = N_elms_Y + 1
-    EID = 0
-    E2N = []
-    for j in range(Ny):
-        for i in range(Nx):
-            NID = 1 + Nx*j + i
-            # skip rolling over elements
-            if i == (Nx - 1) or j == (Ny - 1):
-                continue
-            EID += 1
-            N1 = NID
-            N2 = 1 + Nx*(j+1) + i
-            N3 = N2 + 1
-            N4 = N1 + 1
-            E2N.append([EID, N1, N2, N3, N4])
-    return E2N
+    """CQUAD4 connectivity, (N_elms_X * N_elms_Y, 4) array of node IDs;
+    element IDs are the row numbers + 1"""
+    return get_ruled_E2N(N_elms_X, N_elms_Y)
 
 def get_nodes_from_curve(Curve_Handle, N_elms):
-    return tuple((n.x, n.y, n.z) for n in Curve_Handle.discretize(N_elms+1))
+    """(N_elms + 1, 3) array of points evenly spaced along the curve"""
+    points = Curve_Handle.discretize(N_elms+1)
+    return np.array([(n.x, n.y, n.z) for n in points], dtype=np.float64)
 
 def make_nodes_of_ruled_mesh(Nodes_1, Nodes_2, N_elms_Y):
-    # Make nodes by tracing the streamlines of the surface
-    nodes = []
-    # first set of nodes will be from N_Curve_1
-    NID = 0
-    for i in range(N_elms_Y+1):
-        for j in range(len(Nodes_1)):
-            NID += 1
-            # Get coordinates of the node on Curve 1
-            x1, y1, z1 = Nodes_1[j]
-            # Get coordinates of the node on Curve 2
-            x2, y2, z2 = Nodes_2[j]
-            # get location of current node in ruled surf
-            x = (x2-x1)*(i/N_elms_Y) + x1
-            y = (y2-y1)*(i/N_elms_Y) + y1
-            z = (z2-z1)*(i/N_elms_Y) + z1
-            nodes.append([x, y, z, NID])
-    return nodes
+    """Make nodes by tracing the streamlines of the surface, (N, 3) array
+    of coordinates; node IDs are the row numbers + 1"""
+    return get_ruled_coords(Nodes_1, Nodes_2, N_elms_Y)
@@ -1,6 +1,12 @@
 import re
 import math as m
 import numpy as np
+from mesh_arrays import MeshArrays, get_element_normals, get_N2E_csr
+from mesh_arrays import get_nodal_normals, get_index_dtype
+from mesh_arrays import ElementBlock, SHELL_CORNERS
+
+# number of shell corners --> solid element type they're thickened into
+THICKENED_TYPES = {4: 7, 3: 14}     # CHEXA, CPENTA
 
 def solid_mesh_by_thickened_shell_mesh(*args): # {{{
     """ Sweeps shell elements along node normals into CHEXA/CPENTA #{{{
@@ -21,8 +27,11 @@ def solid_mesh_by_thickened_shell_mesh(*args): # {{{
     - [ ] XXXX.XX.XX | Calibrate to return False if failed. True if works.
     - [ ] XXXX.XX.XX | Make ID offsetting routine that reads arguments in
                        that can offset both element IDs and node IDs
-    - [ ] XXXX.XX.XX | Be able to compute E2NormVec for CTRIA elms with 3 nodes
-    - [ ] XXXX.XX.XX | Be able to compute N2NormVec for CTRIA elms with 3 nodes
+    - [X] 2026.10.17 | Be able to compute E2NormVec for CTRIA elms with 3 nodes
+    - [X] 2026.10.17 | Be able to compute N2NormVec for CTRIA elms with 3 nodes
+    - [X] 2026.10.17 | Thicken with get_thickened_MeshArrays, so CTRIA3s,
+                       mixed meshes and non contiguous IDs work, and the
+                       nodes passed in are left alone
     """ # }}}
     if len(args[0]) == 0:
         print("Error in loft_solid_mesh.")
@@ -39,35 +48,126 @@ def solid_mesh_by_thickened_shell_mesh(*args): # {{{
         print("No defined behavior for number of arguments passed in.")
         return False
 
-    # Construct element ID to normal vector data structure
-    E2NormVec = get_E2NormVec(nodes, E2N)
-
-    # Construct node ID to normal vector data structure
-    N2NormVec = get_N2NormVec(E2NormVec, E2N, nodes)
-
-    # create nodes translated to the correct positions
-    nodes_offset = create_thickened_nodes(nodes, thickness, N2NormVec)
-
-    # create E2N on the new nodes
-    E2N_offset = create_thickened_E2N(E2N, nodes)
-
-    # create E2T_offset on the new elements
-    E2T_offset = {}
-    for EID in E2N_offset:
-        if len(E2N_offset[EID]) == 8:
-            E2T_offset[EID] = 7
-        elif len(E2N_offset[EID]) == 6:
-            E2T_offset[EID] = 14
-        else:
-            print("Error in solid_mesh_lofter.")
-            print("Unknown solid element type requesting E2T in E2T_offset.")
-            return False
+    # sweep the shells along the nodal normals, quads into CHEXAs and
+    # trias into CPENTAs; the shell nodes are kept, the new ones offset by
+    # the highest node ID
+    mesh = MeshArrays.from_dicts(nodes, E2N, E2T)
+    thickened = get_thickened_MeshArrays(mesh, thickness).to_dicts()
+    nodes_offset = thickened['nodes']
+    E2N_offset = thickened['E2N']
+    E2T_offset = thickened['E2T']
 
     # writing out thickened bdf of solid elements
     did_it_work = write_out_thickened_bdf(nodes_offset, E2N_offset, E2T_offset)
     return did_it_work
 # }}}
 
+def get_layer_coords(coords, normals, thickness, N_layers): # {{{
+    """ Node locations of every layer of a thickened shell, all at once
+    coords, normals : base node locations and unit normals, shape (N, 3)
+    Layer k sits k * (thickness / N_layers) along the normals.
+    Returns an (N_layers + 1, N, 3) array, layer 0 being coords.
+    """
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 3)
+    normals = np.asarray(normals, dtype=np.float64).reshape(-1, 3)
+    # get vector magnitude of every layer
+    mag = np.arange(N_layers + 1) * (thickness / N_layers)
+    return coords[None, :, :] + mag[:, None, None] * normals[None, :, :]
+# }}}
+
+def get_layer_E2N(E2N, N_offset, N_layers, dtype=None): # {{{
+    """ Solid connectivity of every layer of a thickened shell, all at once
+    E2N      : corners of the shell elements, shape (n, k), as node indices
+               into layers of N_offset nodes (or as IDs offset by N_offset)
+    Element layer i runs from node layer i (first k nodes) to node layer
+    i + 1 (last k), i.e. CHEXA from quads and CPENTA from trias.
+    Returns an (N_layers, n, 2 * k) array.
+    """
+    E2N = np.asarray(E2N)
+    [n, k] = E2N.shape
+    dtype = E2N.dtype if dtype is None else dtype
+    layer_E2N = np.empty((N_layers, n, 2 * k), dtype=dtype)
+    offsets = (np.arange(N_layers) * N_offset).astype(dtype)
+    np.add(E2N[None, :, :], offsets[:, None, None], out=layer_E2N[:, :, :k],
+           casting='unsafe')
+    np.add(layer_E2N[:, :, :k], N_offset, out=layer_E2N[:, :, k:],
+           casting='unsafe')
+    return layer_E2N
+# }}}
+
+def get_thickened_MeshArrays(mesh, thickness, N_layers=1,
+                             allow_misaligned=False): # {{{
+    """ Sweep the shells of a MeshArrays along the nodal normals into
+    N_layers of solids, thickness in total: quads into CHEXAs, trias into
+    CPENTAs
+    Layer k of nodes sits k * (thickness / N_layers) along the normals and
+    its node IDs are the shell's offset by k times the highest node ID;
+    element layer k likewise offsets the shell's element IDs by k times the
+    highest element ID, so IDs needn't be contiguous. Property IDs and P2M
+    carry over (copied).
+    Nodes whose element normals cancel out have no direction to be swept
+    in, so they raise ValueError, unless allow_misaligned, in which case
+    they're swept along the normal of their first element (with a message).
+    Every layer is built in one go from broadcast arrays, and the stacked
+    nodes come out already sorted, so the connectivity is index arithmetic
+    on the shell's, with no ID lookups.
+    """
+    for e_type in mesh.blocks:
+        if e_type not in SHELL_CORNERS:
+            s = "Only shell meshes can be thickened, not element type "
+            s += str(e_type)
+            raise ValueError(s)
+    if N_layers < 1:
+        raise ValueError("N_layers must be at least 1")
+    if mesh.N_nodes > 0 and mesh.NIDs[0] < 1:
+        raise ValueError("Node IDs must be positive to be offset by layer")
+    if mesh.N_elements > 0 and mesh.EIDs.min() < 1:
+        raise ValueError("Element IDs must be positive to be offset by layer")
+    [normals, is_degenerate, _, _] = mesh.get_nodal_normals()
+    if np.any(is_degenerate):
+        s = str(int(np.sum(is_degenerate))) + " nodes have misaligned normals"
+        s += " (node ID " + str(int(mesh.NIDs[is_degenerate][0]))
+        s += " is one)"
+        if not allow_misaligned:
+            raise ValueError(s + ", can't thicken along them.")
+        s += ", using the normal of their first element instead."
+        print(s)
+    N = mesh.N_nodes
+    NID_offset = int(mesh.NIDs.max()) if N > 0 else 0
+    EID_offset = int(mesh.EIDs.max()) if mesh.N_elements > 0 else 0
+    layers = np.arange(N_layers + 1, dtype=np.int64)
+    # layer after layer of sorted IDs, each past the last, so still sorted
+    NIDs = (mesh.NIDs[None, :] + layers[:, None] * NID_offset).reshape(-1)
+    coords = get_layer_coords(mesh.coords, normals, thickness, N_layers)
+    dtype = get_index_dtype(len(NIDs))
+    buckets = {}
+    for e_type, block in mesh.blocks.items():
+        corners = SHELL_CORNERS[e_type]
+        solid_type = THICKENED_TYPES[corners]
+        # node i of layer k sits at row k * N + i of the stacked nodes
+        E2N = get_layer_E2N(block.E2N[:, :corners], N, N_layers, dtype)
+        EIDs = block.EIDs[None, :] + layers[:-1, None] * EID_offset
+        PIDs = np.tile(block.PIDs, N_layers)
+        if solid_type not in buckets:
+            buckets[solid_type] = ([], [], [])
+        buckets[solid_type][0].append(EIDs.reshape(-1))
+        buckets[solid_type][1].append(E2N.reshape(-1, 2 * corners))
+        buckets[solid_type][2].append(PIDs.reshape(-1))
+    blocks = {}
+    for solid_type, (EIDs, E2N, PIDs) in buckets.items():
+        if len(EIDs) == 1:
+            # layer after layer of sorted IDs, each past the last
+            blocks[solid_type] = ElementBlock(EIDs[0], E2N[0], PIDs[0])
+            continue
+        EIDs = np.concatenate(EIDs)
+        order = np.argsort(EIDs, kind='stable')
+        blocks[solid_type] = ElementBlock(EIDs[order],
+                                          np.concatenate(E2N)[order],
+                                          np.concatenate(PIDs)[order])
+    return MeshArrays(NIDs, coords.reshape(-1, 3), blocks=blocks,
+                      P2M=dict(mesh.P2M))
+# }}}
+
 def write_out_thickened_bdf(nodes_offset, E2N, E2T): # {{{
     """ Write out primitive bdf of thickened solids from mesh
     Void type function. Has no return statement.
@@ -153,6 +253,8 @@ def write_hex_and_pent_data(filename, E2N, E2T, MID, PID): # {{{
                 L += create_padded_bulkdata_field(E2N_offset[EID][3])  # N4
                 L += create_padded_bulkdata_field(E2N_offset[EID][4])  # N5
                 L += create_padded_bulkdata_field(E2N_offset[EID][5])  # N6
+                L += "\n"
+                f.write(L)
             elif len(E2N_offset[EID]) == 15:
                 # It's A PENT15
                 print("Error in write_out_thickened_bdf")
@@ -288,120 +390,89 @@ def write_gridpoint_data_to_file(filename, nodes_offset): # {{{
     return
 # }}}
 
-def create_thickened_E2N(E2N, nodes): # {{{
-    # get highest element ID
-    highest_EID = max(list(E2N.keys()))
-    # get highest node ID
-    NID_offset = list(nodes.keys())[int(len(nodes)/2)-1]
-    # create E2N for hex elements
-    E2N_offset = {}
-    for E in list(E2N.keys()):
-        EID = E + highest_EID
-        N1 = E2N[E][0]
-        N2 = E2N[E][1]
-        N3 = E2N[E][2]
-        N4 = E2N[E][3]
-        N5 = N1 + NID_offset
-        N6 = N2 + NID_offset
-        N7 = N3 + NID_offset
-        N8 = N4 + NID_offset
-        E2N_offset[EID] = [N1, N2, N3, N4, N5, N6, N7, N8]
-    return E2N_offset
-    #}}}
-
-def create_thickened_nodes(nodes, thickness, N2NormVec): # {{{
-    """ Create nodes of the to be created hex elements by thickening the
-    shell mesh along the nodal normals
+def get_EIDs_by_N_nodes(E2N): # {{{
+    """ Groups element IDs by how many nodes the element has
+    Lets elements of mixed sizes be stacked into rectangular arrays.
     """
-    # get highest node ID
-    highest_NID = max(list(nodes.keys()))
-    # the new hex elements will be equivolenced to the 
-    nodes_offset = nodes
-    for N in list(nodes.keys()):
-        NID = N + highest_NID
-        # get the normal vector for this node 
-        V_norm = N2NormVec[N]
-        # compute the new positions of the new node
-        X_new = nodes[N][0] + V_norm[0] * thickness
-        Y_new = nodes[N][1] + V_norm[1] * thickness
-        Z_new = nodes[N][2] + V_norm[2] * thickness
-        nodes_offset[NID] = [X_new, Y_new, Z_new]
-    return nodes_offset
-    # }}}
+    EIDs_by_N_nodes = {}
+    for EID, NIDs_in_elm in E2N.items():
+        N_nodes = len(NIDs_in_elm)
+        if N_nodes not in EIDs_by_N_nodes:
+            EIDs_by_N_nodes[N_nodes] = []
+        EIDs_by_N_nodes[N_nodes].append(EID)
+    return EIDs_by_N_nodes
+# }}}
 
 def get_N2E(E2N): # {{{
     """ Turns the E2N around, giving a dict of N2E
+    Built from the CSR adjacency of get_N2E_csr. The element IDs at every
+    node are in the same order as they are in E2N.
     """
-    for EID, Element in E2N.items():
-        # go through nodes in every element
-        for NID in Element:
-            # if the node's not in N2E yet, prepare for it to be
-            if NID not in N2E:
-                N2E[NID] = []
-            # store the EID with that node ID we're on
-            N2E[NID].append(EID)
+    if len(E2N) == 0:
+        return {}
+    EIDs = np.fromiter(E2N.keys(), dtype=np.int64, count=len(E2N))
+    # pad the connectivity out to a rectangle, -1 marks padding
+    N_max = max(len(NIDs_in_elm) for NIDs_in_elm in E2N.values())
+    E2N_padded = np.full((len(E2N), N_max), -1, dtype=np.int64)
+    for i, NIDs_in_elm in enumerate(E2N.values()):
+        E2N_padded[i, :len(NIDs_in_elm)] = NIDs_in_elm
+    # give every node ID an index, then build the adjacency on indices
+    is_node = E2N_padded >= 0
+    NIDs, inverse = np.unique(E2N_padded[is_node], return_inverse=True)
+    E2N_index = np.full(E2N_padded.shape, -1, dtype=np.int64)
+    E2N_index[is_node] = inverse
+    [offsets, elements] = get_N2E_csr(E2N_index, len(NIDs))
+    N2E = {}
+    for i, NID in enumerate(NIDs.tolist()):
+        N2E[NID] = EIDs[elements[offsets[i]:offsets[i+1]]].tolist()
+    return N2E
 # }}}
 
 def get_N2NormVec(E2NormVec, E2N, nodes): # {{{
-    N2NormVec = {}
-    N2E = get_N2E(E2N)
-    
-    for NID in nodes:
-        elms_with_this_node = N2E[NID]
-        X_comp = 0
-        Y_comp = 0
-        Z_comp = 0
-        for EID in elms_with_this_node:
-            X_comp += E2NormVec[EID][0]
-            Y_comp += E2NormVec[EID][1]
-            Z_comp += E2NormVec[EID][2]
-        mag = ((X_comp**2) + (Y_comp**2) + (Z_comp**2))**0.5
-        X = X_comp/mag
-        Y = Y_comp/mag
-        Z = Z_comp/mag
-        N2NormVec[NID] = [X, Y, Z]
-    return N2NormVec
+    """ Average the element normals at every node
+    Done for all nodes at once by get_nodal_normals over the CSR node to
+    element adjacency. Where the element normals at a node cancel out, the
+    normal of the first element at that node is used and a message printed.
+    """
+    mesh = MeshArrays(list(nodes.keys()), list(nodes.values()))
+    EIDs = []
+    E2N_index = []
+    for group in get_EIDs_by_N_nodes(E2N).values():
+        EIDs.extend(group)
+        E2N_index.append(mesh.node_index([E2N[EID] for EID in group]))
+    [offsets, elements] = get_N2E_csr(E2N_index, mesh.N_nodes)
+    element_normals = np.array([E2NormVec[EID] for EID in EIDs],
+                               dtype=np.float64).reshape(-1, 3)
+    [normals, is_degenerate] = get_nodal_normals(element_normals, offsets,
+                                                 elements)
+    if np.any(is_degenerate):
+        s = str(int(np.sum(is_degenerate))) + " nodes have misaligned normals,"
+        s += " using the normal of their first element instead."
+        print(s)
+    # hand back in the same node order as nodes
+    index = mesh.node_index(list(nodes.keys()))
+    return dict(zip(nodes.keys(), normals[index].tolist()))
 # }}}
 
 def get_E2NormVec(nodes, E2N): #{{{
-    """ Compute the normal vector elements
+    """ Compute the normal vector of every CQUAD4 and CTRIA3 element
+    All elements with the same number of nodes are gathered and computed in
+    one go by get_element_normals. Degenerate elements get [0.0, 0.0, 0.0].
     """
+    mesh = MeshArrays(list(nodes.keys()), list(nodes.values()))
     E2NormVec = {}
-    for EID in list(E2N.keys()):
-        NodeIDs = E2N[EID]
-        these_nodes = []
-        for N in NodeIDs:
-            # get the X coord of this node ID
-            for i in list(nodes.keys()):
-                if i == N:
-                    x = nodes[i][0]
-                    y = nodes[i][1]
-                    z = nodes[i][2]
-                    these_nodes.append([N, x, y, z])
-        # compute every normal vector possible
-        N = these_nodes
-        # Get coordinates of all four points
-        P1 = np.array([N[0][1], N[0][2], N[0][3]])
-        P2 = np.array([N[1][1], N[1][2], N[1][3]])
-        P3 = np.array([N[2][1], N[2][2], N[2][3]])
-        P4 = np.array([N[3][1], N[3][2], N[3][3]])
-        # Get vectors encircling the element
-        V12 = P2 - P1
-        V23 = P3 - P2
-        V34 = P4 - P3
-        V41 = P1 - P4
-        # Get all the cross products
-        NV1 = np.cross(V12, V23)
-        NV2 = np.cross(V23, V34)
-        NV3 = np.cross(V34, V41)
-        NV4 = np.cross(V41, V12)
-        # Compute average of all these vectors
-        NV = NV1 + NV2 + NV3 + NV4
-        # Normalize the magnitude
-        mag = (NV[0]**2 + NV[1]**2 + NV[2]**2)**0.5
-        NV = NV/mag
-        E2NormVec[EID]= [NV[0], NV[1], NV[2]]
-    return E2NormVec
+    for N_nodes, EIDs in get_EIDs_by_N_nodes(E2N).items():
+        if N_nodes not in [3, 4]:
+            s = "Normal vectors only defined for 3 and 4 noded elements"
+            raise ValueError(s)
+        E2N_index = mesh.node_index([E2N[EID] for EID in EIDs])
+        [normals, is_degenerate] = get_element_normals(mesh.coords, E2N_index)
+        if np.any(is_degenerate):
+            print(str(int(np.sum(is_degenerate))) + " degenerate elements given"
+                  + " zero normal vectors.")
+        E2NormVec.update(zip(EIDs, normals.tolist()))
+    # keep the same element order as E2N
+    return {EID: E2NormVec[EID] for EID in E2N}
     #}}}
 
 def shell_mesh_loft_between_two_curves(PL1, PL2, N_e_X, N_e_Y): # {{{
@@ -415,58 +486,57 @@ def shell_mesh_loft_between_two_curves(PL1, PL2, N_e_X, N_e_Y): # {{{
     nodes = make_nodes_of_ruled_mesh(PL1, PL2, N_e_Y)
 
     # Populate E2T for Ruled mesh created between L1 and L2
-    E2T = {}
-    for E in list(E2N.keys()):
-        # CQUAD4 element type is 15
-        E2T[E] = 15
+    # CQUAD4 element type is 15
+    E2T = dict.fromkeys(E2N, 15)
     return [nodes, E2N, E2T]
 # }}}
 
+def get_ruled_E2N(N_elms_X, N_elms_Y): # {{{
+    """ Connectivity of the iso CQUAD4 mesh ruled between two curves
+    Node IDs run from 1 along the curves, row by row, same as
+    get_ruled_coords; element i (ID i + 1) goes row by row too.
+    Returns an (N_elms_X * N_elms_Y, 4) array of node IDs.
+    """
+    Nx = N_elms_X + 1
+    # lower left node ID of every element, by index arithmetic
+    N1 = (1 + Nx * np.arange(N_elms_Y)[:, None] +
+          np.arange(N_elms_X)[None, :]).reshape(-1)
+    N2 = N1 + Nx
+    return np.column_stack((N1, N2, N2 + 1, N1 + 1)).astype(np.int64)
+# }}}
+
+def get_ruled_coords(points_1, points_2, N_elms_Y): # {{{
+    """ Coordinates of the nodes ruled between two discretised curves
+    Both curves are broadcast against the parameter i / N_elms_Y, one row
+    of nodes per step, from points_1 (i = 0) to points_2 (i = N_elms_Y).
+    Returns an ((N_elms_Y + 1) * len(points_1), 3) array, row by row.
+    """
+    points_1 = np.asarray(points_1, dtype=np.float64).reshape(-1, 3)
+    points_2 = np.asarray(points_2, dtype=np.float64).reshape(-1, 3)
+    t = np.arange(N_elms_Y + 1) / N_elms_Y
+    coords = (points_2 - points_1)[None, :, :] * t[:, None, None] + \
+        points_1[None, :, :]
+    return coords.reshape(-1, 3)
+# }}}
+
 def make_elements_of_ruled_mesh(N_elms_X, N_elms_Y): # {{{
     """ Create E2N for iso CQUAD4 shell mesh
     Takes in number of elements in X and number of elements in Y
     E2N has node IDs and element Ids that will both start at 1
+    - [X] 2026.10.17 | built from get_ruled_E2N instead of nested loops
     """
     assert isinstance(N_elms_X,int)
-    Nx = N_elms_X + 1
-    Ny = N_elms_Y + 1
-    EID = 0
-    E2N = {}
-    for j in range(Ny-1):
-        for i in range(Nx-1):
-            NID = 1 + Nx*j + i
-            EID += 1
-            N1 = NID
-            N2 = 1 + Nx*(j+1) + i
-            N3 = N2 + 1
-            N4 = N1 + 1
-            E2N[EID] = [N1, N2, N3, N4]
-    return E2N
+    E2N = get_ruled_E2N(N_elms_X, N_elms_Y)
+    return dict(zip(range(1, len(E2N) + 1), E2N.tolist()))
 # }}}
 
 def make_nodes_of_ruled_mesh(Nodes_1, Nodes_2, N_elms_Y): #{{{
     """ Make nodes by tracing the streamlines of the surface
+    - [X] 2026.10.17 | built from get_ruled_coords instead of nested loops
     """
-    nodes = {}
-    # first set of nodes will be from Nodes_On_Curve_1
-    NID = 0
-    for i in range(N_elms_Y+1):
-        for j in range(len(Nodes_1)):
-            NID = NID + 1
-            # Get coordinates of the node on Curve 1
-            x1 = Nodes_1[j][0]
-            y1 = Nodes_1[j][1]
-            z1 = Nodes_1[j][2]
-            # Get coordinates of the node on Curve 2
-            x2 = Nodes_2[j][0]
-            y2 = Nodes_2[j][1]
-            z2 = Nodes_2[j][2]
-            # get location of current node in ruled surf
-            x = (x2-x1)*(i/N_elms_Y) + x1
-            y = (y2-y1)*(i/N_elms_Y) + y1
-            z = (z2-z1)*(i/N_elms_Y) + z1
-            nodes[NID] = [x, y, z]
-    return nodes #}}}
+    coords = get_ruled_coords(Nodes_1, Nodes_2, N_elms_Y)
+    return dict(zip(range(1, len(coords) + 1), coords.tolist()))
+    #}}}
 
 def get_points_on_3_point_quadratic_fit(N_elms, points): # {{{
     """ given a number of elements, and 3 points defining a spline,
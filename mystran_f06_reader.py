@@ -1,31 +1,102 @@
 import os
 import re
+import json
+import mmap
+import hashlib
+import itertools
 import pathlib
-from copy import copy as copy
-import sys
-def mystran_f06_reader(*args):
-    """
-    It is the goal of this subroutine to read in a f06 file, and return all 
-    pertinant results accordingly.
-    """
-    # look around, get list of the things here
-    things_here = []
-    basepath = '.'
-    with os.scandir(basepath) as entries:
-        for entry in entries:
-            things_here.append(entry.name)
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+# rows of a section held as text before they're turned into numbers, so
+# memory stays bounded however big the section is
+ROW_CHUNK = 2**16
+
+# SOL 101, SOL 1, SOL STATIC, SOL STATICS
+SOL_RE = re.compile(rb'(?i)^SOL (1|101|STATICS?)\s*$')
+
+# case control output requests, e.g. "DISPLACEMENT(PLOT) = ALL"
+REQUEST_RE = re.compile(rb'(?i)^\s*(accel|displ|elforce|force|gpforce|'
+                        rb'spcforce|stress|strain)[a-z]*(\(.*\))?\s*=')
+REQUEST_NAMES = {b'accel': 'acceleration', b'displ': 'displacement',
+                 b'elforce': 'elforce', b'force': 'elforce',
+                 b'gpforce': 'gpforce', b'spcforce': 'spcforce',
+                 b'stress': 'stress', b'strain': 'strain'}
+
+# headers the state machine switches on, all in one pattern so each line is
+# only searched once
+SECTION_RE = re.compile(rb'D I S P L A C E M E N T S|S T R E S S E S|'
+                        rb'G R I D   P O I N T   F O R C E   B A L A N C E')
+SECTION_KINDS = {b'D I S P L A C E M E N T S': 'displacement',
+                 b'S T R E S S E S': 'stress',
+                 b'G R I D   P O I N T   F O R C E   B A L A N C E': 'gpforce'}
+
+# what ends the rows of a grid point force balance
+GPFORCE_END_RE = re.compile(rb'D I S P L A C E M E N T S|S T R E S S E S|'
+                            rb'G R I D   P O I N T   F O R C E   B A L A N C E|'
+                            rb'SUBCASE')
+# FORCE BALANCE FOR GRID POINT <NID> ... <CID>
+GPFORCE_NODE_RE = re.compile(rb'FORCE BALANCE FOR GRID POINT[ \t]+(\d+)'
+                             rb'([^\n]*)')
+# <type> ELEM <EID> T1 T2 T3 R1 R2 R3 (or ELEM <type> <EID> ...), the only
+# rows holding ELEM; starting on the literal keeps the search fast
+GPFORCE_ROW_RE = re.compile(rb'ELEM[ \t]+(?:[A-Za-z]\S*[ \t]+)?(\d+)'
+                            rb'((?:[ \t]+\S+){6})')
+# bytes of a force balance read at a time when reading it straight off the
+# f06 (see read_gpforce_between)
+GPFORCE_CHUNK_BYTES = 2**20
+
+# subcase of the results below, e.g. "OUTPUT FOR SUBCASE 2" or "SUBCASE 2"
+SUBCASE_RE = re.compile(rb'SUBCASE\s*=?\s*(\d+)')
+
+# element type line under a S T R E S S E S header
+STRESS_TYPES = [[b'Q U A D 4', 'QUAD4'], [b'T R I A 3', 'TRIA3'],
+                [b'T E T R A', 'TETRA']]
+
+# columns of each kind of result, after the ID columns
+DISPLACEMENT_COMPONENTS = ['T1', 'T2', 'T3', 'R1', 'R2', 'R3']
+PLATE_STRESS_COMPONENTS = ['fiber_distance', 'Sx', 'Sy', 'Sxy']
+SOLID_STRESS_COMPONENTS = ['Sxx', 'Syy', 'Szz', 'Sxy', 'Syz', 'Szx']
+GPFORCE_COMPONENTS = ['T1', 'T2', 'T3', 'R1', 'R2', 'R3']
+
+# One block of results found in an f06
+#   kind    : 'displacement', 'stress' or 'gpforce'
+#   e_type  : 'QUAD4', 'TRIA3' or 'TETRA' for stresses, None otherwise
+#   subcase : subcase the block is under (1 if the f06 never says)
+#   columns : dict of 1-D arrays, one entry per row of the block
+F06Section = namedtuple('F06Section', 'kind e_type subcase columns')
+
+# Where one block of results is in an f06, see get_f06_index
+#   kind, e_type, subcase : as F06Section
+#   start, end   : byte offsets of the block, from the start of its header
+#                  line to the end of the line that closes it
+F06IndexEntry = namedtuple('F06IndexEntry', 'kind e_type subcase start end')
+
+# file name of the index kept next to an f06
+INDEX_SUFFIX = '.index'
+
+# directory of parsed results kept next to an f06, one .npy per column
+CACHE_SUFFIX = '.cache'
+# bytes of an f06 read at a time to fingerprint its content
+FINGERPRINT_CHUNK = 2**24
 
-    # inspect user inputs 
+def get_f06_filename(args): # {{{
+    """ Work out which f06 to read from the arguments of mystran_f06_reader
+    No argument means the f06 in the current directory (the first by name,
+    if there's more than one).
+    """
     if len(args) == 0:
         # need to look around for an f06 file in stuff here
-        # get f06 files here
-        f06_files_here = []
-        for name in things_here:
-            if re.match(r".*\.f06$", name) is not None:
-                f06_files_here.append(name)
+        with os.scandir('.') as entries:
+            f06_files_here = sorted(entry.name for entry in entries
+                                    if entry.name.lower().endswith(".f06"))
         if len(f06_files_here) == 0:
-            s = "No f06 files found in" + os.getcwd()
+            s = "No f06 files found in " + os.getcwd()
             raise ValueError(s)
+        if len(f06_files_here) > 1:
+            print("Several f06 files found, reading " + f06_files_here[0])
+        return f06_files_here[0]
     elif len(args) == 1:
         argument = args[0]
         # check that it's a string
@@ -38,296 +109,926 @@ def mystran_f06_reader(*args):
         if not pathlib.Path(argument).is_file():
             raise ValueError("argument passed in isn't a file or doesn't exist")
         # if it passes all these, it's probably okay
-        f06_filename = argument
+        return argument
+    s = "Too many arguments passed into mystran_f06_reader"
+    raise ValueError(s)
+# }}}
+
+def is_real(token): # {{{
+    """ True if a token of an f06 row is a real number, not an ID or a label
+    """
+    return b'.' in token
+# }}}
+
+def get_numeric_rows(rows, N_columns): # {{{
+    """ Rows of N_columns whitespace separated numbers, as an (N, N_columns)
+    float array, converted in one go. Rows that aren't N_columns numbers
+    (blank lines, page headers) are left out.
+    """
+    tokens = b' '.join(rows).split()
+    if len(tokens) == N_columns * len(rows):
+        try:
+            return np.array(tokens, dtype=np.float64).reshape(-1, N_columns)
+        except ValueError:
+            pass
+    # something else is mixed in, sort the rows out one at a time
+    tokens = []
+    for line in rows:
+        row = line.split()
+        if len(row) == N_columns and all(t[:1].isdigit() or t[:1] in b'-+.'
+                                         for t in row):
+            tokens.extend(row)
+    return np.array(tokens, dtype=np.float64).reshape(-1, N_columns)
+# }}}
+
+def get_columns(IDs, values, names): # {{{
+    """ dict of 1-D arrays out of ID columns and an (N, len(names)) array
+    """
+    columns = {key: np.asarray(value, dtype=np.int64)
+               for key, value in IDs.items()}
+    for i, name in enumerate(names):
+        columns[name] = values[:, i].copy()
+    return columns
+# }}}
+
+def concatenate_columns(chunks): # {{{
+    """ Join the columns of the chunks of one section, in order
+    """
+    return {key: np.concatenate([chunk[key] for chunk in chunks])
+            for key in chunks[0].keys()}
+# }}}
+
+def get_displacement_columns(rows): # {{{
+    """ Displacement rows, NID CID T1 T2 T3 R1 R2 R3, as columns
+    """
+    values = get_numeric_rows(rows, 8)
+    IDs = {'NID': values[:, 0], 'CID': values[:, 1]}
+    return get_columns(IDs, values[:, 2:], DISPLACEMENT_COMPONENTS)
+# }}}
+
+def get_stress_columns(rows, e_type, carry=None): # {{{
+    """ Stress rows of one element type as columns
+    Rows start with up to two labels, the element ID and the location
+    (CENTER, or a grid ID at the corners), which carry over to the rows
+    below that leave them out:
+    QUAD4, TRIA3: "EID CENTER ...", then the other fiber "...", then for
+                  corner output "GID ..." and its other fiber, per corner
+    TETRA:        "EID ..." at the center only, or with corner output
+                  "EID CENTER ..." followed by "GID ..." per corner
+    Location comes out as 0 at the center, the grid ID at a corner.
+    QUAD4, TRIA3: EID location fiber_distance Sx Sy Sxy
+    TETRA:        EID location Sxx Syy Szz Sxy Syz Szx
+    carry: [EID, location, has_locations] of the row before the first,
+           for a section parsed a chunk at a time; updated in place
+    """
+    is_solid = e_type == 'TETRA'
+    if is_solid:
+        names = SOLID_STRESS_COMPONENTS
     else:
-        s = "Too many arguments passed into mystran_f06_reader"
-        raise ValueError(s)
+        names = PLATE_STRESS_COMPONENTS
+    N_values = len(names)
+    if carry is None:
+        carry = [None, 0, False]
+    [EID, location, has_locations] = carry
+    EIDs = []
+    locations = []
+    tokens = []
+    for line in rows:
+        row = line.split()
+        if len(row) < N_values:
+            continue
+        if b'.' in row[0]:
+            N_labels = 0
+        elif b'.' in row[1]:
+            N_labels = 1
+        else:
+            N_labels = 2
+        if len(row) < N_labels + N_values or \
+                b'.' not in row[N_labels + N_values - 1]:
+            # headers, blank lines
+            continue
+        if N_labels == 2:
+            if not row[0].isdigit():
+                continue
+            EID = int(row[0])
+            location = int(row[1]) if row[1].isdigit() else 0
+            has_locations = True
+        elif N_labels == 1:
+            if not row[0].isdigit():
+                continue
+            if is_solid and not has_locations:
+                EID = int(row[0])
+                location = 0
+            else:
+                location = int(row[0])
+        if EID is None:
+            continue
+        EIDs.append(EID)
+        locations.append(location)
+        tokens.extend(row[N_labels:N_labels + N_values])
+    carry[:] = [EID, location, has_locations]
+    values = np.array(tokens, dtype=np.float64).reshape(-1, N_values)
+    IDs = {'EID': EIDs, 'location': locations}
+    return get_columns(IDs, values, names)
+# }}}
 
-    # read in the f06 file
-    with open(f06_filename) as f:
-        f06 = f.readlines()
+def get_gpforce_block_columns(block): # {{{
+    """ Element rows of grid point force balances as columns
+    block: text (bytes) of any number of whole FORCE BALANCE FOR GRID POINT
+           blocks, one after another
+    No line by line walk: the text is split at the grid point lines with one
+    precompiled pattern, the element rows (the only rows holding ELEM) are
+    picked out of each grid point's text with another, and the numbers are
+    converted all at once.
+    """
+    # [text before the first grid point, NID, rest of line, text, NID, ...]
+    pieces = GPFORCE_NODE_RE.split(block)
+    found = [GPFORCE_ROW_RE.findall(text) for text in pieces[3::3]]
+    rows = list(itertools.chain.from_iterable(found))
+    if len(rows) == 0:
+        IDs = {'NID': [], 'EID': [], 'CID': []}
+        return get_columns(IDs, np.zeros((0, 6)), GPFORCE_COMPONENTS)
+    N_rows = [len(rows_of_node) for rows_of_node in found]
+    # coordinate system is the last field of the grid point line
+    CIDs = []
+    for rest in pieces[2::3]:
+        fields = rest.split()
+        CIDs.append(int(fields[-1]) if fields and fields[-1].isdigit() else 0)
+    [EIDs, numbers] = zip(*rows)
+    values = np.array(b' '.join(numbers).split(), dtype=np.float64)
+    IDs = {'NID': np.repeat(np.array(pieces[1::3], dtype=np.int64), N_rows),
+           'EID': np.array(EIDs, dtype=np.int64),
+           'CID': np.repeat(np.array(CIDs, dtype=np.int64), N_rows)}
+    return get_columns(IDs, values.reshape(-1, 6), GPFORCE_COMPONENTS)
+# }}}
 
-    # is it a linear static run? {{{
-    is_linearstatic = False
-    # SOL 101, SOL 1, SOL STATIC, SOL STATICS
-    for count, line in enumerate(f06):
-        if re.match(r'(?i)^SOL 1\s*$', line):
-            is_linearstatic = True
-            break
-        elif re.match(r'(?i)^SOL 101\s*$', line):
-            is_linearstatic = True
-            break
-        elif re.match(r'(?i)^SOL STATIC\s*$', line):
-            is_linearstatic = True
+def read_run_line(line, run): # {{{
+    """ Pick the SOL line and output requests up off a line of the f06
+    into run, see scan_f06
+    """
+    if b'=' in line:
+        request = REQUEST_RE.match(line)
+        if request is not None:
+            run['requests'].add(REQUEST_NAMES[request.group(1).lower()])
+    elif line[:3].upper() == b'SOL' and SOL_RE.match(line):
+        run['is_linearstatic'] = True
+# }}}
+
+def read_rows(lines, end, parse): # {{{
+    """ Collect rows off lines up to the one containing end, parsing them
+    ROW_CHUNK at a time with parse(rows).
+    Returns the parsed chunks joined into one dict of columns.
+    """
+    chunks = []
+    rows = []
+    for line in lines:
+        if end in line:
             break
-        elif re.match(r'(?i)^SOL STATICS\s*$', line):
-            is_linearstatic = True
+        rows.append(line)
+        if len(rows) >= ROW_CHUNK:
+            chunks.append(parse(rows))
+            rows = []
+    chunks.append(parse(rows))
+    return concatenate_columns(chunks)
+# }}}
+
+def read_gpforce_section(lines): # {{{
+    """ Columns of the grid point force balance coming off lines, see
+    get_gpforce_block_columns, ROW_CHUNK lines at a time (cut between
+    grid points)
+    Returns [columns, line], line being the one that ended the section
+    (the next header or subcase line), None at the end of the f06.
+    """
+    chunks = []
+    rows = []
+    line = None
+    for line in lines:
+        # every header spells out a " E ", numbers never do
+        if (b' E ' in line or b'SUBCASE' in line) and \
+                GPFORCE_END_RE.search(line) is not None:
             break
-    if is_linearstatic == False:
-        raise ValueError("As of 2021.10.31, only know how to do linear statics")
-    #}}}
-
-    # what things are requested out?
-    acceleration_out = False
-    displacement_out = False
-    elforce_out = False
-    gpforce_out = False
-    spcforce_out = False
-    stress_out = False
-    strain_out = False
-    for count, line in enumerate(f06):
-        if re.match(r'(?i)^\s*accel(eration)?(\(.*\))?\s*=', line):
-            acceleration_out = True
-        elif re.match(r'(?i)^\s*displ(acement)?(\(.*\))?\s*=', line):
-            displacement_out = True
-        elif re.match(r'(?i)^\s*(el)?force(\(.*\))?\s*=', line):
-            elforce_out = True
-        elif re.match(r'(?i)^\s*gpforce(\(.*\))?\s*=', line):
-            gpforce_out = True
-        elif re.match(r'(?i)^\s*spcforce(\(.*\))?\s*=', line):
-            spcforce_out = True
-        elif re.match(r'(?i)^\s*stress(\(.*\))?\s*=', line):
-            stress_out = True
-        elif re.match(r'(?i)^\s*strain(\(.*\))?\s*=', line):
-            strain_out = True
-
-    if displacement_out: # {{{
-        # get line where D I S P L A C E M E N T S starts
-        disp_start_index = 0
-        for count, line in enumerate(f06):
-            if re.match(r'^.*D I S P L A C E M E N T S.*$', line):
-                disp_start_index = count
-        # get line where D I S P L A C E M E N T S ends
-        disp_end_index = disp_start_index
-        for count, line in enumerate(f06[disp_start_index:]):
-            if '------' in line:
-                disp_end_index = count + disp_start_index
-                break
-        # consolidate displacement data chunk
-        disp_data_chunk = f06[disp_start_index+4:disp_end_index]
-        displacement_data = {}
-        for line in disp_data_chunk:
-            data_line = re.sub('\s+', ',', line)
-            data_line = re.sub('^,', '', data_line)
-            data_line = re.sub(',$', '', data_line)
-            data = data_line.split(",")
-            NID = int(data[0])
-            CID = int(data[1])
-            T1 = float(data[2])
-            T2 = float(data[3])
-            T3 = float(data[4])
-            R1 = float(data[5])
-            R2 = float(data[6])
-            R3 = float(data[7])
-            # Coordinate ID, Displacements in X, Y, Z, Rotations about X, Y, Z
-            displacement_data[NID] = (CID, T1, T2, T3, R1, R2, R3)
-    #}}}
-
-    if stress_out: #{{{
-        # this will be far harder.
-        # results will be different for the different element/property types
-        stress_indices = []
-        for count, line in enumerate(f06):
-            if re.match(r'^.*S T R E S S E S.*$', line):
-                stress_indices.append(count)
-        # stress_indices are now a list of line numbers at which point we 
-        # have S T R E S S E S appear. Need to loop through them
-        for stress_begin_index in stress_indices:
-            # get line where S T R E S S E S ends
-            stress_end_index = copy(stress_begin_index)
-            for count, line in enumerate(f06[stress_begin_index:]):
-                if '------' in line:
-                    stress_end_index = count + stress_end_index
+        if len(rows) >= ROW_CHUNK and b'FORCE BALANCE' in line:
+            chunks.append(get_gpforce_block_columns(b''.join(rows)))
+            rows = []
+        rows.append(line)
+    else:
+        line = None
+    chunks.append(get_gpforce_block_columns(b''.join(rows)))
+    return [concatenate_columns(chunks), line]
+# }}}
+
+def scan_f06(f06_file, subcase=1): # {{{
+    """ Read an f06 in a single pass
+    f06_file : f06 opened in binary mode, or any iterable of its lines
+    subcase  : subcase of any results before the f06 says which it is
+    The lines are walked once: outside of a section each line is checked
+    against the precompiled headers, and a header hands the lines over to
+    the reader of its section, which just collects rows up to the dashed
+    line that closes it, turning them into numbers in bulk, ROW_CHUNK rows
+    at a time. So nothing is held as text but the current chunk, and every
+    subcase comes out of the one read.
+    Returns [run, sections]
+    run      : {'is_linearstatic': bool, 'requests': set of output names}
+    sections : list of F06Section, in the order they're in the file
+    """
+    run = {'is_linearstatic': False, 'requests': set()}
+    sections = []
+    lines = iter(f06_file)
+
+    def skip(N):
+        for _ in range(N):
+            next(lines, None)
+
+    line = next(lines, None)
+    while line is not None:
+        match = SECTION_RE.search(line)
+        if match is None:
+            if b'SUBCASE' in line:
+                match = SUBCASE_RE.search(line)
+                if match is not None:
+                    subcase = int(match.group(1))
+            else:
+                read_run_line(line, run)
+            line = next(lines, None)
+            continue
+        kind = SECTION_KINDS[match.group(0)]
+        if kind == 'gpforce':
+            # runs up to whatever comes next, which is handled in turn
+            [columns, line] = read_gpforce_section(lines)
+            sections.append(F06Section('gpforce', None, subcase, columns))
+            continue
+        if kind == 'displacement':
+            skip(3)
+            columns = read_rows(lines, b'------', get_displacement_columns)
+            sections.append(F06Section('displacement', None, subcase,
+                                       columns))
+        else:
+            type_line = next(lines, b'')
+            for [label, e_type] in STRESS_TYPES:
+                if label in type_line:
                     break
-            stress_data_chunk = f06[stress_begin_index:stress_end_index]
-            # need to get the element type
-            mode = 'center'
-            e_type = ''
-            if re.match('^.*Q U A D 4.*$',stress_data_chunk[1]) is not None:
-                e_type = 'QUAD4'
-            elif re.match('^.*T R I A 3.*$',stress_data_chunk[1]) is not None:
-                e_type = 'TRIA3'
-            elif re.match('^.*T E T R A.*$',stress_data_chunk[1]) is not None:
-                e_type = 'TETRA'
             else:
                 s = "Unknown element type produced stress results"
                 raise ValueError(s)
-            # if the element type is CQUAD
-            # edge case will exist if only one element has data out
-            # hope that never happens.
-            if e_type == 'QUAD4':
-                e1_match_stat = re.match('^.*CENTER.*$', stress_data_chunk[6])
-                e2_match_stat = re.match('^.*CENTER.*$', stress_data_chunk[9])
-                if None == e1_match_stat and None == e2_match_stat:
-                    # in corner mode
-                    mode = 'corner'
-            # write conditions to deal with both corner mode and center mode
-            stress_data = []
-            if mode == 'center':
-                if e_type == 'QUAD4': 
-                    for count, line in enumerate(stress_data_chunk):
-                        if re.match('^.*CENTER.*$', line) is not None:
-                            data_line_1 = re.sub('\s+', ',', line)
-                            data_line_1= re.sub('^,', '', data_line_1)
-                            data_line_1 = re.sub(',$', '', data_line_1)
-                            data_line_1 = data_line_1.split(',')
-                            data_line_2 = re.sub('\s+', ',',\
-                                          stress_data_chunk[count+1])
-                            data_line_2= re.sub('^,', '', data_line_2)
-                            data_line_2 = re.sub(',$', '', data_line_2)
-                            data_line_2 = data_line_2.split(',')
-                            EID = int(data_line_1[0])
-                            FD1 = float(data_line_1[2])
-                            S_x_1 = float(data_line_1[3])
-                            S_y_1 = float(data_line_1[4])
-                            S_xy_1 = float(data_line_1[5])
-                            FD2 = float(data_line_2[0])
-                            S_x_2 = float(data_line_2[1])
-                            S_y_2 = float(data_line_2[2])
-                            S_xy_2 = float(data_line_2[3])
-                            # EID, e_type, Fiber Distance, Sx, Sy, Sxy
-                            L1 = [EID, e_type, FD1, S_x_1, S_y_1, S_xy_1]
-                            L2 = [EID, e_type, FD2, S_x_2, S_y_2, S_xy_2]
-                            stress_data.append(L1)
-                            stress_data.append(L2)
-                elif e_type == 'TRIA3':
-                    for count, line in enumerate(stress_data_chunk):
-                        if re.match('^.*CENTER.*$', line) is not None:
-                            data_line_1 = re.sub('\s+', ',', line)
-                            data_line_1= re.sub('^,', '', data_line_1)
-                            data_line_1 = re.sub(',$', '', data_line_1)
-                            data_line_1 = data_line_1.split(',')
-                            data_line_2 = re.sub('\s+', ',',\
-                                          stress_data_chunk[count+1])
-                            data_line_2= re.sub('^,', '', data_line_2)
-                            data_line_2 = re.sub(',$', '', data_line_2)
-                            data_line_2 = data_line_2.split(',')
-                            EID = int(data_line_1[0])
-                            FD1 = float(data_line_1[2])
-                            S_x_1 = float(data_line_1[3])
-                            S_y_1 = float(data_line_1[4])
-                            S_xy_1 = float(data_line_1[5])
-                            FD2 = float(data_line_2[0])
-                            S_x_2 = float(data_line_2[1])
-                            S_y_2 = float(data_line_2[2])
-                            S_xy_2 = float(data_line_2[3])
-                            # EID, e_type, Fiber Distance, Sx, Sy, Sxy
-                            L1 = [EID, e_type, FD1, S_x_1, S_y_1, S_xy_1]
-                            L2 = [EID, e_type, FD2, S_x_2, S_y_2, S_xy_2]
-                            stress_data.append(L1)
-                            stress_data.append(L2)
-                elif e_type == 'TETRA':
-                    for count, line in enumerate(stress_data_chunk[4:]):
-                        data_line = re.sub('\s+', ',', line)
-                        data_line = re.sub('^,', '', data_line)
-                        data_line = re.sub(',$', '', data_line)
-                        data_line = data_line.split(',')
-                        EID = int(data_line[0])
-                        Sxx = float(data_line[1])
-                        Syy = float(data_line[2])
-                        Szz = float(data_line[3])
-                        Sxy = float(data_line[4])
-                        Syz = float(data_line[5])
-                        Szx = float(data_line[6])
-                        # EID, e_type, Sxx, Syy, Szz, Sxy, Szx
-                        L = [EID, e_type, Sxx, Syy, Szz, Sxy, Sxy]
-                        stress_data.append(L)
+            # labels carry over from chunk to chunk
+            carry = [None, 0, False]
+            columns = read_rows(lines, b'------', lambda rows:
+                                get_stress_columns(rows, e_type, carry))
+            sections.append(F06Section('stress', e_type, subcase, columns))
+        line = next(lines, None)
+    return [run, sections]
+# }}}
+
+def find_all(buffer, label): # {{{
+    """ Offsets of every occurrence of label in buffer (bytes, mmap)
+    """
+    offsets = []
+    find = buffer.find
+    offset = find(label)
+    while offset != -1:
+        offsets.append(offset)
+        offset = find(label, offset + 1)
+    return offsets
+# }}}
+
+def get_line_end(buffer, offset): # {{{
+    """ Offset just after the end of the line offset is in
+    """
+    end = buffer.find(b'\n', offset)
+    return len(buffer) if end == -1 else end + 1
+# }}}
+
+def index_f06(buffer): # {{{
+    """ Find every block of results in an f06 held in buffer (e.g. an mmap)
+    Only the headers are looked for, with plain substring searches, so this
+    runs far faster than reading the rows; the dashed line closing each
+    block is found the same way.
+    Blocks end where scan_f06 ends them: a displacement or stress block at
+    its dashed line (anything inside it is skipped), a force balance at the
+    next header or SUBCASE line.
+    Returns [run, entries], run as in scan_f06 (picked up from the text
+    before the first block), entries a list of F06IndexEntry in file order.
+    """
+    hits = []
+    for label, kind in SECTION_KINDS.items():
+        hits.extend([offset, kind] for offset in find_all(buffer, label))
+    hits.extend([offset, 'subcase'] for offset in find_all(buffer, b'SUBCASE'))
+    hits.sort()
+
+    entries = []
+    subcase = 1
+    open_gpforce = None
+    covered = 0     # end of what scan_f06 reads without looking at it
+    for [offset, kind] in hits:
+        if offset < covered:
+            # inside a block, where scan_f06 isn't looking for anything
+            continue
+        start = buffer.rfind(b'\n', 0, offset) + 1
+        if open_gpforce is not None:
+            # a force balance runs up to whatever comes after it, subcase
+            # lines included
+            entries.append(open_gpforce._replace(end=start))
+            open_gpforce = None
+        if kind == 'subcase':
+            match = SUBCASE_RE.match(buffer, offset)
+            if match is not None:
+                subcase = int(match.group(1))
+            continue
+        header_end = get_line_end(buffer, offset)
+        if kind == 'gpforce':
+            open_gpforce = F06IndexEntry(kind, None, subcase, start, None)
+            covered = header_end
+            continue
+        e_type = None
+        if kind == 'stress':
+            type_line = buffer[header_end:get_line_end(buffer, header_end)]
+            for [label, e_type] in STRESS_TYPES:
+                if label in type_line:
+                    break
             else:
-                s = "As of 2021.11.02, corner stress reading not written yet."
+                s = "Unknown element type produced stress results"
                 raise ValueError(s)
-    #}}}
-
-    if gpforce_out: # {{{
-        # get line with first G R I D   P O I N T   F O R C E   B A L A N C E 
-        gp_re_str = '^.*G R I D   P O I N T   F O R C E   B A L A N C E.*$'
-        gpforce_start_index = 0
-        for count, line in enumerate(f06):
-            if re.match(gp_re_str, line):
-                gpforce_start_index = count
-        # get all of the strings 
-        gpforce_data = []
-        for count, line in enumerate(f06[gpforce_start_index:]):
-            # check if the line starts with "FORCE BALANCE FOR"
-            s = r"^.*FORCE BALANCE FOR GRID POINT.*$"
-            if re.match(s, line) is not None:
-                data_line = re.sub('\s+', ',', line)
-                data_line = re.sub('^,', '', data_line)
-                data_line = re.sub(',$', '', data_line)
-                data = data_line.split(",")
-                NID = int(data[5])
-                CoordID = int(data[len(data)-1])
-                # gpforce_data will be of the form
-                # NID, EID, T1, T2, T3, R1, R2, R3, CoordID
-                gpforce_strings = []
-                done_yet = False
-                i = 3
-                while not done_yet:
-                    i += 1
-                    newline = f06[gpforce_start_index+count+i]
-                    newline = re.sub('^\s+', '', newline)
-                    if "-----"in newline:
-                        done_yet = True
-                        continue
-                    gpforce_strings.append(newline)
-                # have all the gpforce strings for this node ID
-                for entry in gpforce_strings:
-                    if "ELEM" in entry:
-                        elem_line = re.sub('\s+',',', entry)
-                        elem_line = re.sub(',$','', elem_line)
-                        elem_data = elem_line.split(',')
-                        EID = int(elem_data[2])
-                        T1 = float(elem_data[3])
-                        T2 = float(elem_data[4])
-                        T3 = float(elem_data[5])
-                        R1 = float(elem_data[6])
-                        R2 = float(elem_data[7])
-                        R3 = float(elem_data[8])
-                        dat_entry = [NID, EID, T1, T2, T3, R1, R2, R3, CoordID]
-                        gpforce_data.append(dat_entry)
-    #}}}
-
-    # combine results to return into a dict to send back
+        dashes = buffer.find(b'------', header_end)
+        end = len(buffer) if dashes == -1 else get_line_end(buffer, dashes)
+        entries.append(F06IndexEntry(kind, e_type, subcase, start, end))
+        covered = end
+    if open_gpforce is not None:
+        entries.append(open_gpforce._replace(end=len(buffer)))
+
+    run = {'is_linearstatic': False, 'requests': set()}
+    head_end = entries[0].start if len(entries) > 0 else len(buffer)
+    for line in buffer[:head_end].splitlines():
+        read_run_line(line, run)
+    return [run, entries]
+# }}}
+
+def get_f06_stamp(f06_filename): # {{{
+    """ What an index or cache of an f06 is checked against to tell if the
+    f06 has changed since
+    """
+    stat = os.stat(f06_filename)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+# }}}
+
+def get_f06_index(f06_filename, rebuild=False): # {{{
+    """ Index of the blocks of results in an f06, see index_f06
+    The f06 is memory mapped and indexed once; the index is saved next to
+    it (f06_filename + INDEX_SUFFIX, json) and loaded from there on later
+    calls, for as long as the f06's size and modification time match.
+    Returns [run, entries]
+    """
+    index_filename = f06_filename + INDEX_SUFFIX
+    stamp = get_f06_stamp(f06_filename)
+    if not rebuild and os.path.isfile(index_filename):
+        try:
+            with open(index_filename) as f:
+                saved = json.load(f)
+            if saved['stamp'] == stamp:
+                run = {'is_linearstatic': saved['is_linearstatic'],
+                       'requests': set(saved['requests'])}
+                entries = [F06IndexEntry(*entry) for entry in saved['entries']]
+                return [run, entries]
+        except (ValueError, KeyError, TypeError):
+            print("Index " + index_filename + " unreadable, rebuilding it")
+
+    with open(f06_filename, 'rb') as f06:
+        if stamp['size'] == 0:
+            [run, entries] = index_f06(b'')
+        else:
+            with mmap.mmap(f06.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                [run, entries] = index_f06(mm)
+    saved = {'stamp': stamp, 'is_linearstatic': run['is_linearstatic'],
+             'requests': sorted(run['requests']),
+             'entries': [list(entry) for entry in entries]}
+    try:
+        with open(index_filename, 'w') as f:
+            json.dump(saved, f)
+    except OSError:
+        print("Couldn't write index " + index_filename)
+    return [run, entries]
+# }}}
+
+def get_lines_between(f06, start, end): # {{{
+    """ Lines of an open (binary) f06 from byte start up to byte end
+    """
+    f06.seek(start)
+    position = start
+    while position < end:
+        line = f06.readline()
+        if not line:
+            return
+        position += len(line)
+        yield line
+# }}}
+
+def read_gpforce_between(f06, start, end): # {{{
+    """ Columns of the grid point force balance in an open (binary) f06
+    from byte start up to byte end (an F06IndexEntry's)
+    Read GPFORCE_CHUNK_BYTES at a time, each cut after the last whole grid
+    point in it, and handed to get_gpforce_block_columns as they are, with
+    no lines split out at all.
+    """
+    f06.seek(start)
+    chunks = []
+    left = b''
+    position = start
+    while position < end:
+        data = f06.read(min(GPFORCE_CHUNK_BYTES, end - position))
+        if not data:
+            break
+        position += len(data)
+        block = left + data
+        left = b''
+        if position < end:
+            cut = block.rfind(b'FORCE BALANCE FOR GRID POINT')
+            if cut <= 0:
+                left = block
+                continue
+            [block, left] = [block[:cut], block[cut:]]
+        chunks.append(get_gpforce_block_columns(block))
+    if left:
+        chunks.append(get_gpforce_block_columns(left))
+    chunks.append(get_gpforce_block_columns(b''))
+    return concatenate_columns(chunks)
+# }}}
+
+def read_entry(f06, entry): # {{{
+    """ F06Section of the block of an open (binary) f06 at an F06IndexEntry
+    """
+    if entry.kind == 'gpforce':
+        columns = read_gpforce_between(f06, entry.start, entry.end)
+        return F06Section('gpforce', None, entry.subcase, columns)
+    lines = get_lines_between(f06, entry.start, entry.end)
+    return scan_f06(lines, entry.subcase)[1][0]
+# }}}
+
+def read_f06_sections(f06_filename, kind=None, e_type=None, subcase=None,
+                      index=None): # {{{
+    """ Read only some blocks of results of an f06, seeking straight to them
+    kind, e_type, subcase: which blocks to read, None meaning any
+    index: [run, entries] of the f06, from get_f06_index by default
+    Returns [entries, sections], the F06IndexEntry and F06Section of each
+    block read, lined up.
+    """
+    if index is None:
+        index = get_f06_index(f06_filename)
+    entries = [entry for entry in index[1]
+               if (kind is None or entry.kind == kind) and
+                  (e_type is None or entry.e_type == e_type) and
+                  (subcase is None or entry.subcase == subcase)]
+    sections = []
+    with open(f06_filename, 'rb', buffering=2**20) as f06:
+        for entry in entries:
+            sections.append(read_entry(f06, entry))
+    return [entries, sections]
+# }}}
+
+def sort_columns(columns, keys): # {{{
+    """ Rows of a dict of columns sorted by the columns named in keys, first
+    key first. The sort is stable, so rows of one ID keep the order they
+    had in the f06 (e.g. center then corners, bottom fiber then top).
+    """
+    order = np.lexsort([columns[key] for key in reversed(keys)])
+    return {name: column[order] for name, column in columns.items()}
+# }}}
+
+def get_ID_rows(columns, ID_name, IDs): # {{{
+    """ [start, end] of the rows of each of IDs in columns sorted by ID_name
+    Rows of IDs[i] are start[i]:end[i], empty for IDs that aren't there.
+    """
+    sorted_IDs = columns[ID_name]
+    IDs = np.asarray(IDs, dtype=np.int64)
+    start = np.searchsorted(sorted_IDs, IDs, side='left')
+    end = np.searchsorted(sorted_IDs, IDs, side='right')
+    return [start, end]
+# }}}
+
+def get_envelope(columns, ID_name, component): # {{{
+    """ Minimum and maximum of a component over the rows of each ID
+    columns must be sorted by ID_name, as the reader returns them.
+    Returns [IDs, minimum, maximum], one entry per ID.
+    """
+    sorted_IDs = columns[ID_name]
+    values = columns[component]
+    if len(sorted_IDs) == 0:
+        return [sorted_IDs, values, values]
+    starts = np.flatnonzero(np.r_[True, sorted_IDs[1:] != sorted_IDs[:-1]])
+    minimum = np.minimum.reduceat(values, starts)
+    maximum = np.maximum.reduceat(values, starts)
+    return [sorted_IDs[starts], minimum, maximum]
+# }}}
+
+def get_von_mises(columns, e_type): # {{{
+    """ von Mises stress of every row of a stress block
+    """
+    c = columns
+    if e_type == 'TETRA':
+        return np.sqrt(0.5 * ((c['Sxx'] - c['Syy'])**2 +
+                              (c['Syy'] - c['Szz'])**2 +
+                              (c['Szz'] - c['Sxx'])**2) +
+                       3 * (c['Sxy']**2 + c['Syz']**2 + c['Szx']**2))
+    return np.sqrt(c['Sx']**2 - c['Sx'] * c['Sy'] + c['Sy']**2 +
+                   3 * c['Sxy']**2)
+# }}}
+
+def get_free_body_sums(gpforce, node_groups, element_groups=None,
+                       node_coords=None, points=None): # {{{
+    """ Resultants of the grid point forces at groups of nodes, all at once
+    gpforce        : gpforce columns of one subcase, from mystran_f06_reader
+    node_groups    : list of arrays of NIDs, one per free body (e.g. the
+                     nodes of a cut); a node can be in several
+    element_groups : optional list of arrays of EIDs, lined up with
+                     node_groups, the elements of each free body; only their
+                     forces are counted. All elements count without it.
+    node_coords    : [NIDs, coords] of the grids, needed for points
+    points         : (3,) or (N_groups, 3) points to take moments about, so
+                     the forces' moment arms are added in; without them the
+                     moment components are just summed
+    Every matching row of every group is found with binary searches and
+    summed with bincount, with no loop over groups or rows.
+    Returns an (N_groups, 6) array of T1 T2 T3 R1 R2 R3 sums.
+    """
+    N_groups = len(node_groups)
+    NIDs = np.asarray(gpforce['NID'], dtype=np.int64)
+    group_NIDs = np.concatenate([np.asarray(g, dtype=np.int64).reshape(-1)
+                                 for g in node_groups] +
+                                [np.zeros(0, dtype=np.int64)])
+    labels = np.repeat(np.arange(N_groups),
+                       [np.size(g) for g in node_groups])
+    order = np.argsort(group_NIDs, kind='stable')
+    group_NIDs = group_NIDs[order]
+    labels = labels[order]
+    # every (row, group) pair whose node is in the group
+    start = np.searchsorted(group_NIDs, NIDs, side='left')
+    N_matches = np.searchsorted(group_NIDs, NIDs, side='right') - start
+    rows = np.repeat(np.arange(len(NIDs)), N_matches)
+    first = np.repeat(start - np.cumsum(N_matches) + N_matches, N_matches)
+    groups = labels[first + np.arange(len(rows))]
+
+    if element_groups is not None:
+        EIDs = np.asarray(gpforce['EID'], dtype=np.int64)
+        group_EIDs = [np.asarray(g, dtype=np.int64).reshape(-1)
+                      for g in element_groups]
+        N_EIDs = max([int(EIDs.max(initial=0))] +
+                     [int(g.max(initial=0)) for g in group_EIDs]) + 1
+        # (group, EID) pairs as one integer each
+        keys = np.concatenate([i * N_EIDs + g for i, g in
+                               enumerate(group_EIDs)] +
+                              [np.zeros(0, dtype=np.int64)])
+        is_in_body = np.isin(groups * N_EIDs + EIDs[rows], keys)
+        rows = rows[is_in_body]
+        groups = groups[is_in_body]
+
+    if np.any(gpforce['CID'][rows] != 0):
+        s = "As of 2026.10.17, only grid point forces in coordinate system 0 "
+        s += "can be summed"
+        raise ValueError(s)
+    forces = np.column_stack([gpforce[k][rows] for k in ['T1', 'T2', 'T3']])
+    moments = np.column_stack([gpforce[k][rows] for k in ['R1', 'R2', 'R3']])
+    if points is not None:
+        if node_coords is None:
+            raise ValueError("node_coords are needed to take moments about points")
+        [coord_NIDs, coords] = node_coords
+        coord_NIDs = np.asarray(coord_NIDs, dtype=np.int64)
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 3)
+        order = np.argsort(coord_NIDs, kind='stable')
+        index = np.searchsorted(coord_NIDs[order], NIDs[rows])
+        index = index.clip(max=len(order) - 1)
+        if len(order) == 0 or np.any(coord_NIDs[order][index] != NIDs[rows]):
+            raise ValueError("node_coords are missing grids of node_groups")
+        arms = coords[order][index] - \
+            np.broadcast_to(np.asarray(points, dtype=np.float64),
+                            (N_groups, 3))[groups]
+        moments = moments + np.cross(arms, forces)
+    values = np.column_stack((forces, moments))
+    sums = np.zeros((N_groups, 6))
+    for i in range(6):
+        sums[:, i] = np.bincount(groups, weights=values[:, i],
+                                 minlength=N_groups)
+    return sums
+# }}}
+
+def get_results(run, sections): # {{{
+    """ Results of a scanned f06 to hand back, out of scan_f06's output
+    Only results that were requested, keyed by subcase; blocks of the same
+    results under one subcase are joined.
+    """
+    blocks = {}
+    for section in sections:
+        key = (section.kind, section.e_type, section.subcase)
+        blocks.setdefault(key, []).append(section.columns)
+
+    sort_keys = {'displacement': ['NID'], 'stress': ['EID'],
+                 'gpforce': ['NID', 'EID']}
+    results = {}
+    for [kind, e_type, subcase], chunks in blocks.items():
+        if kind not in run['requests']:
+            continue
+        columns = sort_columns(concatenate_columns(chunks), sort_keys[kind])
+        by_subcase = results.setdefault(kind, {})
+        if kind == 'stress':
+            by_subcase.setdefault(subcase, {})[e_type] = columns
+        else:
+            by_subcase[subcase] = columns
+    return results
+# }}}
+
+def read_indexed_section(f06_filename, entry): # {{{
+    """ F06Section of the block of an f06 at an F06IndexEntry
+    Stands alone so it can be sent to a worker process.
+    """
+    with open(f06_filename, 'rb', buffering=2**20) as f06:
+        return read_entry(f06, entry)
+# }}}
+
+def read_f06_files(f06_filenames, N_workers=None): # {{{
+    """ Read many f06 files at once, on a pool of worker processes
+    Each f06 is indexed (see get_f06_index), then every block of results of
+    every file is handed out to the workers on its own, biggest first, so a
+    single large f06 is spread over the workers too. What comes back is
+    merged, each kind of result into one set of columns for all the files,
+    with two more columns saying where each row is from:
+    file    : index of the f06 in f06_filenames
+    subcase : subcase in that f06
+    Returns {'displacement': columns, 'stress': {e_type: columns},
+    'gpforce': columns}, only holding what was requested in some f06, and
+    each sorted by file, subcase then ID (see mystran_f06_reader).
+    N_workers: defaults to the number of cpus; 1 reads in this process,
+    which is what has to be used from inside FreeCAD, since its executable
+    can't be started as a worker.
+    """
+    f06_filenames = list(f06_filenames)
+    tasks = []
+    for i, f06_filename in enumerate(f06_filenames):
+        [run, entries] = get_f06_index(f06_filename)
+        if not run['is_linearstatic']:
+            s = f06_filename + ": As of 2021.10.31, only know how to do " +\
+                "linear statics"
+            raise ValueError(s)
+        tasks.extend([i, f06_filename, entry] for entry in entries
+                     if entry.kind in run['requests'])
+    tasks.sort(key=lambda task: task[2].start - task[2].end)
+
+    if N_workers is None:
+        N_workers = os.cpu_count() or 1
+    N_workers = min(N_workers, len(tasks))
+    if N_workers <= 1:
+        sections = [read_indexed_section(f06_filename, entry)
+                    for [i, f06_filename, entry] in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=N_workers) as executor:
+            sections = list(executor.map(read_indexed_section,
+                                         [task[1] for task in tasks],
+                                         [task[2] for task in tasks]))
+
+    blocks = {}
+    for [i, f06_filename, entry], section in zip(tasks, sections):
+        columns = dict(section.columns)
+        N_rows = len(next(iter(columns.values())))
+        columns['file'] = np.full(N_rows, i, dtype=np.int64)
+        columns['subcase'] = np.full(N_rows, section.subcase, dtype=np.int64)
+        blocks.setdefault((section.kind, section.e_type), []).append(
+            [entry.start, i, columns])
+
+    sort_keys = {'displacement': ['file', 'subcase', 'NID'],
+                 'stress': ['file', 'subcase', 'EID'],
+                 'gpforce': ['file', 'subcase', 'NID', 'EID']}
     results = {}
-    if displacement_out:
-        results_to_return['displacement'] = displacement_data
-    if stress_out:
-        results_to_return['stress'] = stress_data
-    if gpforce_out:
-        results_to_return['gpforce'] = gpforce_data
+    for [kind, e_type], chunks in blocks.items():
+        # back in file order first, so equal keys keep their f06 order
+        chunks.sort(key=lambda chunk: (chunk[1], chunk[0]))
+        columns = concatenate_columns([chunk[2] for chunk in chunks])
+        columns = sort_columns(columns, sort_keys[kind])
+        if kind == 'stress':
+            results.setdefault('stress', {})[e_type] = columns
+        else:
+            results[kind] = columns
+    return results
+# }}}
+
+def get_f06_fingerprint(f06_filename): # {{{
+    """ Hash of the whole content of an f06, read FINGERPRINT_CHUNK at a time
+    Every byte is hashed, since a rerun can change numbers anywhere without
+    changing the size; hashing is still far quicker than parsing.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(f06_filename, 'rb') as f06:
+        for chunk in iter(lambda: f06.read(FINGERPRINT_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+# }}}
+
+def flatten_results(results): # {{{
+    """ [kind, subcase, e_type, columns] of every set of columns in results
+    """
+    flat = []
+    for kind, by_subcase in results.items():
+        for subcase, value in by_subcase.items():
+            if kind == 'stress':
+                for e_type, columns in value.items():
+                    flat.append([kind, subcase, e_type, columns])
+            else:
+                flat.append([kind, subcase, None, value])
+    return flat
+# }}}
 
+def save_results_cache(f06_filename, results, stamp=None): # {{{
+    """ Save results of an f06 next to it, f06_filename + CACHE_SUFFIX
+    Every column goes into its own .npy, so they can be memory mapped back;
+    cache.json, written last, says what's there and which f06 it's for
+    (size, modification time and fingerprint, see get_f06_fingerprint).
+    """
+    if stamp is None:
+        stamp = get_f06_stamp(f06_filename)
+        stamp['fingerprint'] = get_f06_fingerprint(f06_filename)
+    cache_dir = f06_filename + CACHE_SUFFIX
+    meta_filename = os.path.join(cache_dir, 'cache.json')
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        if os.path.isfile(meta_filename):
+            # out of date, don't let it be picked up half overwritten
+            os.remove(meta_filename)
+        for name in os.listdir(cache_dir):
+            if name.endswith('.npy'):
+                os.remove(os.path.join(cache_dir, name))
+        blocks = []
+        for i, [kind, subcase, e_type, columns] in \
+                enumerate(flatten_results(results)):
+            for name, column in columns.items():
+                filename = os.path.join(cache_dir, "%d_%s.npy" % (i, name))
+                np.save(filename, column)
+            blocks.append([kind, subcase, e_type, list(columns.keys())])
+        with open(meta_filename, 'w') as f:
+            json.dump({'stamp': stamp, 'blocks': blocks}, f)
+    except OSError:
+        print("Couldn't write results cache " + cache_dir)
+# }}}
+
+def load_results_cache(f06_filename, mmap_mode=None): # {{{
+    """ Results of an f06 saved by save_results_cache, or None if there
+    aren't any or the f06 has changed since
+    The f06 counts as unchanged if its size and modification time match,
+    or if its size and fingerprint do (copied, or touched), which takes
+    hashing the whole f06 (see get_f06_fingerprint).
+    Columns are loaded into memory by default, writable like the ones read
+    from the f06; mmap_mode (as np.load) maps them instead, e.g. 'r' to
+    share them read only between processes opening the same results.
+    """
+    cache_dir = f06_filename + CACHE_SUFFIX
+    meta_filename = os.path.join(cache_dir, 'cache.json')
+    if not os.path.isfile(meta_filename):
+        return None
+    try:
+        with open(meta_filename) as f:
+            meta = json.load(f)
+        saved = meta['stamp']
+        stamp = get_f06_stamp(f06_filename)
+        if saved['size'] != stamp['size']:
+            return None
+        if saved['mtime_ns'] != stamp['mtime_ns']:
+            if saved['fingerprint'] != get_f06_fingerprint(f06_filename):
+                return None
+        results = {}
+        for i, [kind, subcase, e_type, names] in enumerate(meta['blocks']):
+            columns = {name: np.load(os.path.join(cache_dir,
+                                                  "%d_%s.npy" % (i, name)),
+                                     mmap_mode=mmap_mode)
+                       for name in names}
+            by_subcase = results.setdefault(kind, {})
+            if kind == 'stress':
+                by_subcase.setdefault(subcase, {})[e_type] = columns
+            else:
+                by_subcase[subcase] = columns
+        return results
+    except (OSError, ValueError, KeyError, TypeError):
+        print("Results cache " + cache_dir + " unreadable, reading the f06")
+        return None
+# }}}
+
+def mystran_f06_reader(*args, use_cache=False):
+    """
+    It is the goal of this subroutine to read in a f06 file, and return all
+    pertinant results accordingly. (read_f06_files reads many at once.)
+    With use_cache, results are saved next to the f06 the first time and
+    loaded back from there after that (see load_results_cache), as long as
+    the f06 doesn't change. Checking that can take hashing the whole f06,
+    so it's off by default.
+    The f06 is read once, as it streams in (see scan_f06), and results come
+    back keyed by subcase, as columns: dicts of 1-D arrays with one entry
+    per row, sorted by ID so rows can be found with a binary search (see
+    get_ID_rows):
+    displacement: {subcase: columns}
+                  NID CID T1 T2 T3 R1 R2 R3, sorted by NID
+    stress:       {subcase: {e_type: columns}}, sorted by EID, location is
+                  0 at the center, the grid ID at a corner (see
+                  get_stress_columns)
+                  QUAD4, TRIA3: EID location fiber_distance Sx Sy Sxy
+                  TETRA:        EID location Sxx Syy Szz Sxy Syz Szx
+    gpforce:      {subcase: columns}
+                  NID EID CID T1 T2 T3 R1 R2 R3, sorted by NID then EID
+    """
+    f06_filename = get_f06_filename(args)
+    if use_cache:
+        results = load_results_cache(f06_filename)
+        if results is not None:
+            return results
+        # stamped before reading, so a change while reading isn't missed
+        stamp = get_f06_stamp(f06_filename)
+        stamp['fingerprint'] = get_f06_fingerprint(f06_filename)
+    with open(f06_filename, 'rb', buffering=2**20) as f06:
+        [run, sections] = scan_f06(f06)
+    if not run['is_linearstatic']:
+        raise ValueError("As of 2021.10.31, only know how to do linear statics")
+    results = get_results(run, sections)
+    if use_cache:
+        save_results_cache(f06_filename, results, stamp)
     return results
 
-        
+
+def write_example_f06(f06_filename, subcases=(1, 2, 3)): # {{{
+    """ Small f06 with displacements, QUAD4 stresses and a grid point force
+    balance under each of subcases, for main to check the readers against
+    Every force balance but the last is followed by the next subcase's line
+    and then a force balance with no header of its own, which belongs to no
+    block, so a force balance not closed at the subcase line picks it up.
+    """
+    def reals(values):
+        return "".join("%14.6E" % value for value in values)
+    lines = [" MYSTRAN Version 15.0", "SOL 101", "CEND",
+             "   DISPLACEMENT(PLOT) = ALL", "   STRESS = ALL",
+             "   GPFORCE = ALL", "BEGIN BULK"]
+    for k, subcase in enumerate(subcases):
+        lines += ["", " OUTPUT FOR SUBCASE        %d" % subcase, "",
+                  " " * 45 + "D I S P L A C E M E N T S",
+                  " " * 37 + "(in global coordinate system at each grid)",
+                  "           GRID     COORD      T1            T2"
+                  "            T3            R1            R2            R3",
+                  "                     SYS"]
+        for NID in range(1, 4):
+            values = [subcase + NID / 10 + i / 100 for i in range(6)]
+            lines.append("     %8d     %3d " % (NID, 0) + reals(values))
+        lines += [" " * 26 + "------------- -------------",
+                  " OUTPUT FOR SUBCASE        %d" % subcase,
+                  " " * 15 + "E L E M E N T   S T R E S S E S   I N   L O C A L"
+                  "   E L E M E N T   C O O R D I N A T E   S Y S T E M",
+                  " " * 32 + "F O R   E L E M E N T   T Y P E   Q U A D 4", "",
+                  "  Element  Location      Fibre        Stresses In Element"
+                  " Coord System",
+                  "     ID                Distance     Normal-X       Normal-Y"
+                  "      Shear-XY", ""]
+        for EID in range(1, 3):
+            values = [subcase + EID / 10 + i / 100 for i in range(8)]
+            lines.append("  %8d  %-8s" % (EID, "CENTER") +
+                         reals([-0.05] + values[:4]))
+            lines.append(" " * 20 + reals([0.05] + values[4:]))
+        lines += [" " * 26 + "------------- -------------",
+                  " OUTPUT FOR SUBCASE        %d" % subcase,
+                  " " * 30 + "G R I D   P O I N T   F O R C E   B A L A N C E",
+                  ""]
+        for NID in range(1, 3):
+            lines += [" FORCE BALANCE FOR GRID POINT     %8d IN GLOBAL COORD"
+                      " SYSTEM %d" % (NID, 0), "",
+                      " APPLIED FORCE            " + reals([0] * 6)]
+            for EID in range(1, 3):
+                values = [subcase + NID + EID / 10 + i / 100 for i in range(6)]
+                lines.append(" CQUAD4     ELEM  %8d" % EID + reals(values))
+            lines += [" TOTALS                   " + reals([0] * 6), ""]
+        if k < len(subcases) - 1:
+            lines += [" OUTPUT FOR SUBCASE        %d" % subcases[k + 1],
+                      " FORCE BALANCE FOR GRID POINT     %8d IN GLOBAL COORD"
+                      " SYSTEM 0" % 99,
+                      " CQUAD4     ELEM  %8d" % 99 + reals([9] * 6), ""]
+    with open(f06_filename, 'w') as f:
+        f.write("\n".join(lines) + "\n")
+# }}}
+
 def main():
-    # for development purposes, read anchor to testbed location from cli in
-    testbed_location = sys.argv[1]
-
-    """ Development Chunks
-    # get it able to read centers first
-    tet_filename_center = testbed_location +\
-    "/TETRA/center_stress/Example_output.F06"
-    #mystran_f06_reader(tet_filename_center)
-    tria_filename_center = testbed_location +\
-    "/CTRIA3/centered_stresses/CTRIA3_centered_stress.F06"
-    #mystran_f06_reader(tria_filename_center)
-    quad_filename_center= testbed_location +\
-    "/CQUAD4/centered_stresses/all_together_center_stresses.F06"
-    mystran_f06_reader(quad_filename_center)
-    return
-
-    # get it able to read corners (only really does anything for QUAD4 elements
-    # (thank GOD)
-    tet_filename_center = testbed_location +\
-    "/TETRA/corner_stress/Example_output.F06"
-    #mystran_f06_reader(tet_filename_center)
-    tria_filename_center = testbed_location +\
-    "/CTRIA3/corner_stresses/CTRIA3_centered_stress.F06"
-    #mystran_f06_reader(tria_filename_center)
-    quad_filename_center= testbed_location +\
-    "/CQUAD4/corner_stresses/all_together_corner_stress.F06"
-    #mystran_f06_reader(quad_filename_center)
+    """ Regression: the single pass reader (scan_f06) and the indexed one
+    (index_f06, read_f06_sections) have to find the same blocks, with the
+    same rows, in an f06 with several subcases (see write_example_f06).
     """
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp:
+        f06_filename = os.path.join(tmp, "example.f06")
+        write_example_f06(f06_filename)
+        with open(f06_filename, 'rb') as f06:
+            [run, scanned] = scan_f06(f06)
+        [entries, indexed] = read_f06_sections(
+            f06_filename, index=get_f06_index(f06_filename, rebuild=True))
+    if len(scanned) != 9 or len(indexed) != len(scanned):
+        s = "Found " + str(len(scanned)) + " blocks scanning and " + \
+            str(len(indexed)) + " indexed, expected 9"
+        raise ValueError(s)
+    for [a, b] in zip(scanned, indexed):
+        if a[:3] != b[:3] or a.columns.keys() != b.columns.keys() or \
+                not all(np.array_equal(a.columns[key], b.columns[key])
+                        for key in a.columns):
+            s = "Scanned and indexed " + a.kind + " of subcase " + \
+                str(a.subcase) + " don't match"
+            raise ValueError(s)
+        if a.kind == 'gpforce' and 99 in a.columns['NID']:
+            raise ValueError("Force balance ran past its subcase")
+    print("scan_f06 and index_f06 agree on " + str(len(scanned)) + " blocks")
 
 if __name__ == "__main__":
     main()
-
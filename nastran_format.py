@@ -0,0 +1,391 @@
+import math
+import time
+from functools import lru_cache
+import numpy as np
+
+# 10**0 ... 10**18, as int64, for picking digits out of integers
+POW10 = 10 ** np.arange(19, dtype=np.int64)
+
+def get_optimal_short_form_float(x): # {{{
+    """ Get optimal way to print the number in 8 characters
+    This is the reference implementation. get_short_form_floats must print
+    exactly the same thing for every value this prints.
+    """
+    x_raw_string = "{:50.100f}".format(x)
+    # check for zero
+    if x == 0.0:
+        x_str = " 0.0    "
+        return x_str
+
+    # check for power of 10
+    if round(x,7) == 0:
+        x_str = " 0.0    "
+        return x_str
+    elif math.log(abs(round(x,7)),10).is_integer():
+        x_str = "1." + "+" + str(int(math.log(round(x,7),10)))
+        x_str += " " * (8 - len(x_str))
+        return x_str
+
+    # get the order of magnitude of the point coordinates
+    order = math.ceil(math.log(abs(x),10))
+    if order == 0:
+        order_of_order = 0
+    elif order > 0:
+        order_of_order = math.ceil(math.log(abs(order+1),10))
+    elif order < 0:
+        order_of_order = math.ceil(math.log(abs(order-1),10))
+
+    # get optimal number of data characters allowed
+    if x > 0: # positive
+        if order >= 7:
+            reduced_number = x/(10**(order-1))
+            reduced_number = round(reduced_number,6)
+            format_string = "{:1." + str(5 - order_of_order) + "f}"
+            reduced_number = format_string.format(reduced_number)
+            x_str = reduced_number + "+" + str(order)
+        elif order < -2:
+            reduced_number = x/(10**(order-1))
+            reduced_number = round(reduced_number,6)
+            format_string = "{:1." + str(5 - order_of_order) + "f}"
+            reduced_number = format_string.format(reduced_number)
+            x_str = reduced_number + str(order)
+        else: # this means just use the raw number
+            x = round(x,7)
+            format_string = "{:"
+            lower_order = math.floor(math.log(abs(x),10))
+            format_string += str(max(order,0))
+            format_string += "."
+            if order == lower_order:
+                format_string += str(6 - max(order,0))
+            else:
+                format_string += str(7 - max(order,0))
+            format_string += "f}"
+            if order > 0:
+                x_str = format_string.format(x)
+            else:
+                x_str = format_string.format(x)[1:]
+    else: # negative
+        if order >= 6:
+            reduced_number = x/(10**(order-1))
+            reduced_number = round(reduced_number,6)
+            format_string = "{:1." + str(4 - order_of_order) + "f}"
+            reduced_number = format_string.format(reduced_number)
+            x_str = reduced_number + "+" + str(order)
+        elif order < -2:
+            reduced_number = x/(10**(order-1))
+            reduced_number = round(reduced_number,6)
+            format_string = "{:1." + str(4 - order_of_order) + "f}"
+            reduced_number = format_string.format(reduced_number)
+            x_str = reduced_number + str(order)
+        else:
+            format_string = "{:"
+            format_string += str(max(order,0))
+            format_string += "."
+            # check if is a power of 10
+            if math.log(abs(x),10).is_integer():
+                format_string += str(5 - max(order,0))
+            else:
+                format_string += str(6 - max(order,0))
+            format_string += "f}"
+            if order > 0:
+                x_str = format_string.format(x)
+            else:
+                x_str = format_string.format(x)[0] + format_string.format(x)[2:]
+
+    # check that x_str is the right length
+    if len(x_str) != 8:
+        print(x_str)
+        print(x)
+        print(math.log(x,10))
+        raise ValueError("printed value string is wrong length!")
+    return x_str
+    # }}}
+
+def get_large_field_float(x): # {{{
+    """ Print the number in 16 characters, for large field (GRID*) cards
+    Keeps as many significant digits as fit, no search needed.
+    """
+    if not math.isfinite(x):
+        raise ValueError("Can't print " + str(x) + " as a nastran real")
+    if x == 0.0:
+        x = 0.0     # no "-0.0"
+    digits = 10
+    if x < 0:
+        digits -= 1
+    x_str = "{:.{d}E}".format(x, d=digits)
+    if len(x_str) != 16:
+        # three digit exponent, give up a digit of the mantissa for it
+        digits -= len(x_str) - 16
+        x_str = "{:.{d}E}".format(x, d=digits)
+    if len(x_str) != 16:
+        raise ValueError("printed value string is wrong length!")
+    return x_str
+# }}}
+
+# values the vector path can't vouch for go through these, once per value
+cached_short_form_float = lru_cache(maxsize=2**16)(get_optimal_short_form_float)
+cached_large_field_float = lru_cache(maxsize=2**16)(get_large_field_float)
+
+def get_rounded_integers(y): # {{{
+    """ np.rint, plus a flag where y is too close to a half to trust it
+    y is a float product that's off from the exact product by up to an ulp,
+    so rounding can only be trusted when y isn't within a few ulp of a tie.
+    """
+    R = np.rint(y)
+    distance_to_tie = np.abs(np.abs(y - np.floor(y)) - 0.5)
+    is_ambiguous = distance_to_tie <= 1e-9 + 8 * np.spacing(np.abs(y))
+    return [R.astype(np.int64), is_ambiguous]
+# }}}
+
+def get_shortened_integers(R, N_dropped): # {{{
+    """ Round integers R to drop N_dropped trailing digits
+    Returns [rounded, is_tie]. Exact ties depend on which side of the tie
+    the binary value sat, so they're flagged instead of guessed.
+    """
+    div = POW10[N_dropped]
+    rounded = R // div
+    twice_remainder = 2 * (R % div)
+    rounded = rounded + (twice_remainder > div)
+    is_tie = (twice_remainder == div) & (N_dropped > 0)
+    return [rounded, is_tie]
+# }}}
+
+def get_N_digits(R): # {{{
+    """ Number of decimal digits of non negative integers (0 has 1)
+    """
+    return np.searchsorted(POW10, R, side='right').clip(min=1)
+# }}}
+
+def assemble_real_strings(width, is_negative, R, N_digits, N_before_point,
+                          has_exponent, with_E, exponent): # {{{
+    """ Build fixed width strings of nastran reals from integer parts
+    Every string is laid out as
+        ["-"] digits[:N_before_point] "." digits[N_before_point:] [exponent]
+    where digits are the N_digits digits of R, zero padded on the left, and
+    the exponent is ["E"] sign digits_of_|exponent| (at least two digits
+    when with_E). Returns [strings, lengths]; strings are only right where
+    lengths == width.
+    """
+    N = len(R)
+    with_E = np.asarray(with_E, dtype=bool)
+    is_negative = np.asarray(is_negative, dtype=bool)
+    has_exponent = np.asarray(has_exponent, dtype=bool)
+    sign_length = is_negative.astype(np.int64)
+    exponent_digits = get_N_digits(np.abs(exponent))
+    exponent_digits = np.where(with_E, np.maximum(exponent_digits, 2),
+                               exponent_digits)
+    exponent_length = has_exponent * (with_E + 1 + exponent_digits)
+    lengths = sign_length + N_digits + 1 + exponent_length
+    chars = np.full((N, width), ord(' '), dtype=np.uint8)
+
+    # only a handful of layouts turn up, and within one every column is
+    # either a fixed character or one digit of R or of the exponent
+    layout = [is_negative, N_digits, N_before_point, has_exponent, with_E,
+              exponent_digits, exponent < 0]
+    key = np.zeros(N, dtype=np.int64)
+    for [column, radix] in zip(layout, [2, 20, 20, 2, 2, 4, 2]):
+        key = radix * key + np.clip(column, 0, radix - 1)
+    key[lengths > width] = -1
+    for k in np.flatnonzero(np.bincount(key[key >= 0])).tolist():
+        rows = np.flatnonzero(key == k)
+        [negative, N_d, N_b, with_exponent, E, N_e, negative_exponent] = \
+            [int(column[rows[0]]) for column in layout]
+        R_rows = R[rows]
+        columns = []
+        if negative:
+            columns.append(ord('-'))
+        digits = [(R_rows // POW10[N_d - 1 - d]) % 10 + ord('0')
+                  for d in range(N_d)]
+        columns += digits[:N_b] + [ord('.')] + digits[N_b:]
+        if with_exponent:
+            if E:
+                columns.append(ord('E'))
+            columns.append(ord('-') if negative_exponent else ord('+'))
+            e_rows = np.abs(exponent[rows])
+            columns += [(e_rows // POW10[N_e - 1 - d]) % 10 + ord('0')
+                        for d in range(N_e)]
+        for [j, column] in enumerate(columns):
+            chars[rows, j] = column
+    strings = chars.view('S' + str(width)).reshape(-1).astype('U' + str(width))
+    return [strings, lengths]
+# }}}
+
+def get_short_form_floats(values): # {{{
+    """ get_optimal_short_form_float for a whole array of values at once
+    Exponents and mantissas are worked out with array arithmetic. Values
+    where the rounding can't be vouched for (ties, powers of ten, anything
+    that wouldn't fit) fall back on the cached reference function, so the
+    output is byte for byte the same, errors included.
+    Returns an array of 8 character strings with the shape of values.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    x = values.reshape(-1)
+    is_negative = x < 0
+    is_positive = ~is_negative
+    ax = np.abs(x)
+    use_scalar = ~np.isfinite(x)
+    finite_ax = np.where(use_scalar, 1.0, ax)
+
+    # round(x, 7) as a count of 1e-7's, only needed below 1e8
+    is_small = finite_ax < 1e8
+    [I7, is_ambiguous] = get_rounded_integers(np.where(is_small, finite_ax,
+                                                       0.0) * 1e7)
+    use_scalar |= is_small & is_ambiguous
+    is_zero = (x == 0) | (is_small & (I7 == 0))
+
+    # powers of ten go down odd paths (some raise), leave them be
+    with np.errstate(divide='ignore'):
+        log_ax = np.log10(np.where(is_zero, 1.0, finite_ax))
+    is_near_p10 = np.abs(log_ax - np.rint(log_ax)) < 1e-7
+    is_near_p10 |= is_small & np.isin(I7, POW10)
+    use_scalar |= ~is_zero & is_near_p10
+    order = np.ceil(log_ax).astype(np.int64)
+    use_scalar |= np.abs(order) > 99
+    is_vector = ~use_scalar & ~is_zero
+
+    is_exponent = (is_positive & (order >= 7)) | (is_negative & (order >= 6))
+    is_exponent = is_vector & (is_exponent | (order < -2))
+    is_raw = is_vector & ~is_exponent
+
+    R = np.zeros(len(x), dtype=np.int64)
+    N_digits = np.ones(len(x), dtype=np.int64)
+    N_before_point = np.zeros(len(x), dtype=np.int64)
+
+    # raw positive: round(x, 7) printed with 7 - max(order, 0) decimals
+    i = is_raw & is_positive
+    [R_i, is_tie] = get_shortened_integers(I7[i], np.maximum(order[i], 0))
+    R[i] = R_i
+    use_scalar[np.flatnonzero(i)[is_tie]] = True
+    N_digits[i] = 7
+    N_before_point[i] = np.maximum(order[i], 0)
+
+    # raw negative: x printed with 6 - max(order, 0) decimals
+    i = is_raw & is_negative
+    decimals = 6 - np.maximum(order[i], 0)
+    [R_i, is_ambiguous] = get_rounded_integers(ax[i] * 10.0**decimals)
+    R[i] = R_i
+    use_scalar[np.flatnonzero(i)[is_ambiguous]] = True
+    N_digits[i] = 6
+    N_before_point[i] = np.maximum(order[i], 0)
+
+    # exponent form: x/10**(order-1) rounded to 6, then to fewer decimals
+    i = is_exponent
+    divisors = {o: float(10**(o-1)) for o in np.unique(order[i]).tolist()}
+    divisor = np.array([divisors[o] for o in order[i].tolist()], dtype=float)
+    [I6, is_ambiguous] = get_rounded_integers(ax[i] / divisor * 1e6)
+    order_of_order = get_N_digits(np.abs(order[i]))
+    decimals = np.where(is_positive[i], 5, 4) - order_of_order
+    [R_i, is_tie] = get_shortened_integers(I6, 6 - decimals)
+    R[i] = R_i
+    use_scalar[np.flatnonzero(i)[is_ambiguous | is_tie]] = True
+    N_digits[i] = decimals + 1
+    N_before_point[i] = 1
+
+    [strings, lengths] = assemble_real_strings(8, is_negative, R, N_digits,
+        N_before_point, is_exponent, np.zeros(len(x), dtype=bool), order)
+    # anything too long or too short would have raised, let it
+    use_scalar |= is_vector & ((lengths != 8) | (R >= POW10[N_digits]))
+    strings[is_zero & ~use_scalar] = " 0.0    "
+    for index in np.flatnonzero(use_scalar).tolist():
+        strings[index] = cached_short_form_float(float(x[index]))
+    return strings.reshape(values.shape)
+# }}}
+
+def get_large_field_floats(values): # {{{
+    """ get_large_field_float for a whole array of values at once
+    Returns an array of 16 character strings with the shape of values.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    x = values.reshape(-1)
+    x = np.where(x == 0, 0.0, x)
+    is_negative = x < 0
+    ax = np.abs(x)
+    use_scalar = ~np.isfinite(x)
+    finite_ax = np.where(use_scalar | (ax == 0), 1.0, ax)
+    exponent = np.floor(np.log10(finite_ax)).astype(np.int64)
+    exponent = np.where(ax == 0, 0, exponent)
+    use_scalar |= np.abs(exponent) > 99
+    decimals = 10 - is_negative
+    # mantissa scaled up to an integer with decimals + 1 digits
+    scale = np.clip(decimals - exponent, -300, 300).astype(np.float64)
+    [R, is_ambiguous] = get_rounded_integers(ax * 10.0**scale)
+    # log10 can be off by one right at powers of ten, and rounding can
+    # carry into another digit; let the scalar path sort those out
+    is_wrong_size = (R < POW10[decimals]) | (R >= POW10[decimals + 1])
+    use_scalar |= (is_ambiguous | is_wrong_size) & (ax != 0)
+    R = np.where(ax == 0, 0, R)
+    [strings, lengths] = assemble_real_strings(16, is_negative, R,
+        decimals + 1, np.ones(len(x), dtype=np.int64),
+        np.ones(len(x), dtype=np.int64), np.ones(len(x), dtype=bool),
+        exponent)
+    use_scalar |= lengths != 16
+    for index in np.flatnonzero(use_scalar).tolist():
+        strings[index] = cached_large_field_float(float(x[index]))
+    return strings.reshape(values.shape)
+# }}}
+
+def main(): # {{{
+    """ Regression check and timing of the vector path against the reference
+    Run as a script: python nastran_format.py [N_values]
+    """
+    import sys
+    N_values = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    rng = np.random.default_rng(2021)
+    # coordinates over many decades, both signs, plus the awkward ones
+    corpus = [
+        rng.uniform(-1, 1, N_values) * 10.0**rng.integers(-12, 12, N_values),
+        np.round(rng.uniform(-1000, 1000, N_values // 4), 3),
+        np.round(rng.uniform(-100, 100, N_values // 4), 7),
+        np.round(rng.uniform(-1, 1, N_values // 4), 8),
+        10.0**np.arange(-12, 13),
+        -10.0**np.arange(-12, 13),
+        np.array([0.0, -0.0, 5e-8, 4.9999999e-8, 0.99999996, 9.9999999,
+                  0.0999999996, 99999.995, 1234567.85, 0.00123455]),
+    ]
+    corpus = np.concatenate(corpus)
+
+    def reference(x):
+        try:
+            return get_optimal_short_form_float(x)
+        except Exception as e:
+            return type(e)
+
+    def vector(x):
+        try:
+            return str(get_short_form_floats(np.array([x]))[0])
+        except Exception as e:
+            return type(e)
+
+    # byte for byte against the reference, values it raises on included
+    import contextlib, io
+    with contextlib.redirect_stdout(io.StringIO()):
+        expected = [reference(x) for x in corpus.tolist()]
+        raises = np.array([not isinstance(e, str) for e in expected])
+        got = get_short_form_floats(corpus[~raises]).tolist()
+        N_wrong = sum(1 for x in corpus[raises].tolist()
+                      if vector(x) != reference(x))
+    expected = [e for e in expected if isinstance(e, str)]
+    N_wrong += sum(1 for a, b in zip(expected, got) if a != b)
+    print(str(len(corpus)) + " short form values, " + str(N_wrong) + " differ")
+    got = get_large_field_floats(corpus).tolist()
+    N_wrong = sum(1 for a, b in zip(corpus.tolist(), got)
+                  if get_large_field_float(a) != b)
+    print(str(len(corpus)) + " large field values, " + str(N_wrong) + " differ")
+
+    # timing, on values the reference doesn't raise on
+    timed = rng.uniform(-500, 500, N_values)
+    start = time.perf_counter()
+    for x in timed.tolist():
+        get_optimal_short_form_float(x)
+    t_reference = time.perf_counter() - start
+    start = time.perf_counter()
+    get_short_form_floats(timed)
+    t_vector = time.perf_counter() - start
+    per_million = 1e6 / N_values
+    print("reference: {:.2f} s per million".format(t_reference * per_million))
+    print("vector:    {:.2f} s per million".format(t_vector * per_million))
+    print("speedup:   {:.1f}x".format(t_reference / t_vector))
+# }}}
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+import numpy as np
+from spatial_index import get_spatial_index
+from bdf_writer import get_GRID_lines, write_lines, CHUNK_SIZE
+
+def get_RBE3_lines(EID, NID_ref, NIDs_to_mpc): # {{{
+    """ Free field lines of one RBE3 card, reference node NID_ref taking
+    123456 and the nodes of NIDs_to_mpc weighted 1.0 in 123
+    Two of the nodes fit on the first line, eight on every one after.
+    """
+    NIDs_to_mpc = [str(NID) for NID in NIDs_to_mpc]
+    lines = ["RBE3," + str(EID) + ",," + str(NID_ref) + ",123456,1.0,123," +
+             ",".join(NIDs_to_mpc[:2])]
+    for i in range(2, len(NIDs_to_mpc), 8):
+        lines.append("," + ",".join(NIDs_to_mpc[i:i+8]))
+    return lines
+# }}}
+
+def read_fastener_csv(filename): # {{{
+    """ Centres and radii of fasteners from a CSV with x, y, z, R per line
+    Lines that don't start with a number (headers, # comments) are skipped.
+    Returns [centers, radii], shapes (N, 3) and (N,).
+    """
+    rows = []
+    with open(filename, mode='rt', encoding='utf-8') as f:
+        for line in f:
+            fields = line.split(",")
+            try:
+                rows.append([float(v) for v in fields[:4]])
+            except ValueError:
+                continue
+            if len(rows[-1]) != 4:
+                s = "Fastener lines need x, y, z and R: " + line.strip()
+                raise ValueError(s)
+    rows = np.array(rows, dtype=np.float64).reshape(-1, 4)
+    return [rows[:, :3], rows[:, 3]]
+# }}}
+
+def write_RBE3_include(filename, mesh, centers, radii, NID_start=None,
+                       EID_start=None, chunk_size=CHUNK_SIZE): # {{{
+    """ Stream a GRID and an RBE3 per sphere out to an include file
+    mesh    : MeshArrays the RBE3s attach to
+    centers : sphere centres, shape (N_spheres, 3)
+    radii   : one radius, or one per sphere
+    Every ball is found in one query on the mesh's cached spatial index.
+    The reference GRIDs are numbered from NID_start and the RBE3s from
+    EID_start, each defaulting to one past the highest ID of the mesh.
+    Spheres with no nodes in them get no cards; it's up to the caller to
+    report them.
+    Returns [NIDs_ref, EIDs], lined up with centers, -1 where skipped.
+    """
+    centers = np.asarray(centers, dtype=np.float64).reshape(-1, 3)
+    if NID_start is None:
+        NID_start = int(mesh.NIDs.max()) + 1 if mesh.N_nodes > 0 else 1
+    if EID_start is None:
+        EID_start = int(mesh.EIDs.max()) + 1 if mesh.N_elements > 0 else 1
+    [offsets, NIDs] = get_spatial_index(mesh).query_balls(centers, radii)
+    counts = np.diff(offsets)
+    is_used = counts > 0
+    N_used = int(np.sum(is_used))
+    NIDs_ref = np.full(len(centers), -1, dtype=np.int64)
+    EIDs = np.full(len(centers), -1, dtype=np.int64)
+    NIDs_ref[is_used] = NID_start + np.arange(N_used)
+    EIDs[is_used] = EID_start + np.arange(N_used)
+    used = np.flatnonzero(is_used)
+    with open(filename, mode='wt', encoding='utf-8', buffering=2**20) as inc:
+        for start in range(0, N_used, chunk_size):
+            chunk = used[start:start+chunk_size]
+            lines = get_GRID_lines(NIDs_ref[chunk], centers[chunk], 'free')
+            for i in chunk.tolist():
+                lines += get_RBE3_lines(EIDs[i], NIDs_ref[i],
+                                        NIDs[offsets[i]:offsets[i+1]].tolist())
+            write_lines(inc, lines, is_first=start == 0)
+        if N_used > 0:
+            inc.write("\n")
+    return [NIDs_ref, EIDs]
+# }}}
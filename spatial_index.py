@@ -0,0 +1,138 @@
+from collections import OrderedDict
+import numpy as np
+
+# how many meshes' trees get_spatial_index holds on to
+SPATIAL_INDEX_CACHE_SIZE = 8
+SPATIAL_INDEX_CACHE = OrderedDict()
+
+class SpatialIndex: # {{{
+    """ k-d tree over a set of nodes, with queries that answer in node IDs
+    NIDs   : node IDs, int64, shape (N,)
+    coords : node locations, float64, shape (N, 3)
+    tree   : cKDTree of coords (None if there are no nodes)
+    The tree is built once; every query after that only costs the search.
+    """
+    def __init__(self, NIDs, coords): # {{{
+        self.NIDs = np.asarray(NIDs, dtype=np.int64).reshape(-1)
+        self.coords = np.asarray(coords, dtype=np.float64).reshape(-1, 3)
+        if len(self.NIDs) != len(self.coords):
+            raise ValueError("NIDs and coords have different lengths")
+        # scipy.spatial takes longer to import than everything else here,
+        # so it's only imported once there's a tree to build
+        from scipy.spatial import cKDTree
+        self.tree = cKDTree(self.coords) if len(self.NIDs) > 0 else None
+    # }}}
+
+    @classmethod
+    def from_dict(cls, nodes): # {{{
+        """ Build from the legacy {NID: [x, y, z]} dict
+        """
+        NIDs = np.fromiter(nodes.keys(), dtype=np.int64, count=len(nodes))
+        coords = np.array(list(nodes.values()), dtype=np.float64)
+        return cls(NIDs, coords.reshape(-1, 3))
+    # }}}
+
+    def query_ball(self, point, radius): # {{{
+        """ Sorted IDs of the nodes within radius of point
+        """
+        if self.tree is None:
+            return np.zeros(0, dtype=np.int64)
+        index = self.tree.query_ball_point(np.asarray(point, dtype=np.float64),
+                                           radius, return_sorted=True)
+        return np.sort(self.NIDs[np.asarray(index, dtype=np.int64)])
+    # }}}
+
+    def query_balls(self, points, radii): # {{{
+        """ IDs of the nodes within radii of each of points, all in one query
+        points : shape (N_points, 3)
+        radii  : one radius, or one per point
+        Returns [offsets, NIDs] (CSR, like get_N2E_csr): the nodes of point i
+        are NIDs[offsets[i]:offsets[i+1]], sorted.
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        radii = np.broadcast_to(np.asarray(radii, dtype=np.float64),
+                                (len(points),))
+        if self.tree is None or len(points) == 0:
+            return [np.zeros(len(points) + 1, dtype=np.int64),
+                    np.zeros(0, dtype=np.int64)]
+        found = self.tree.query_ball_point(points, radii)
+        counts = np.fromiter((len(f) for f in found), dtype=np.int64,
+                             count=len(found))
+        offsets = np.zeros(len(points) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        index = np.fromiter((i for f in found for i in f), dtype=np.int64,
+                            count=offsets[-1])
+        NIDs = self.NIDs[index]
+        # sort within each point's run: by point, then by ID
+        point_of = np.repeat(np.arange(len(points)), counts)
+        NIDs = NIDs[np.lexsort((NIDs, point_of))]
+        return [offsets, NIDs]
+    # }}}
+
+    def query_nearest(self, points, k=1, max_distance=np.inf): # {{{
+        """ The k nearest nodes to each of points
+        Returns [distances, NIDs], shape (N_points, k); where fewer than k
+        nodes are within max_distance, the distance is inf and the ID -1.
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        distances = np.full((len(points), k), np.inf)
+        NIDs = np.full((len(points), k), -1, dtype=np.int64)
+        if self.tree is None or len(points) == 0:
+            return [distances, NIDs]
+        [found_distances, index] = self.tree.query(
+            points, k=[i + 1 for i in range(k)],
+            distance_upper_bound=max_distance)
+        is_found = index < len(self.NIDs)
+        distances[is_found] = found_distances[is_found]
+        NIDs[is_found] = self.NIDs[index[is_found]]
+        return [distances, NIDs]
+    # }}}
+
+    def query_pairs(self, tol): # {{{
+        """ Pairs of nodes within tol of each other, as node IDs
+        Returns an (N_pairs, 2) array, lower ID first in each row, sorted.
+        """
+        if self.tree is None:
+            return np.zeros((0, 2), dtype=np.int64)
+        pairs = self.NIDs[self.tree.query_pairs(tol, output_type='ndarray')]
+        pairs = np.sort(pairs.reshape(-1, 2), axis=1)
+        return pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+    # }}}
+
+    def query_pairs_with(self, other, tol): # {{{
+        """ Pairs of a node here and a node of another SpatialIndex within
+        tol of each other, as node IDs
+        Returns an (N_pairs, 2) array, [NID here, NID in other] per row.
+        """
+        if self.tree is None or other.tree is None:
+            return np.zeros((0, 2), dtype=np.int64)
+        matches = self.tree.sparse_distance_matrix(other.tree, tol,
+                                                   output_type='ndarray')
+        return np.column_stack((self.NIDs[matches['i']],
+                                other.NIDs[matches['j']]))
+    # }}}
+# }}}
+
+def get_spatial_index(mesh, version=None): # {{{
+    """ SpatialIndex of the nodes of a MeshArrays, built once and then
+    handed back from a cache for as long as the mesh is the same
+    A mesh counts as the same while its NIDs and coords are the same array
+    objects and version is the same; whoever moves nodes in place must
+    pass a new version (any hashable) to have the tree rebuilt. The cache
+    holds SPATIAL_INDEX_CACHE_SIZE meshes, dropping the least recently
+    used.
+    """
+    key = (id(mesh.NIDs), id(mesh.coords), version)
+    cached = SPATIAL_INDEX_CACHE.get(key)
+    # the cache holds on to the arrays, so their ids can't be reused while
+    # the entry is alive; still check, in case the key came from a dead mesh
+    if cached is not None and cached[0] is mesh.NIDs and \
+            cached[1] is mesh.coords:
+        SPATIAL_INDEX_CACHE.move_to_end(key)
+        return cached[2]
+    index = SpatialIndex(mesh.NIDs, mesh.coords)
+    SPATIAL_INDEX_CACHE[key] = (mesh.NIDs, mesh.coords, index)
+    while len(SPATIAL_INDEX_CACHE) > SPATIAL_INDEX_CACHE_SIZE:
+        SPATIAL_INDEX_CACHE.popitem(last=False)
+    return index
+# }}}
@@ -0,0 +1,93 @@
+import os
+import sys
+import json
+import subprocess
+
+# GUI-free modules and macros, and the seconds each may take to import in
+# a fresh interpreter (numpy and scipy included, they're most of it)
+IMPORT_BUDGETS = {
+    'nastran_format': 0.5,
+    'mesh_arrays': 0.5,
+    'mesh_renumbering': 0.5,
+    'mesh_utilities': 0.5,
+    'mesh_routines': 0.5,
+    'bdf_writer': 0.5,
+    'mystran_f06_reader': 0.5,
+    'spatial_index': 0.5,
+    'mesh_equivalencing': 1.0,
+    'rbe3_writer': 0.5,
+    'batch_mesh': 0.5,
+    'macros/flip_shell_mesh_normals.py': 0.5,
+    'macros/make_bush_spider_from_node_set.py': 0.5,
+    'macros/export_mystran_analysis.py': 0.5,
+    'macros/proto_mesh_equivalencer.py': 1.0,
+    'macros/make_rbe3_within_sphere.py': 0.5,
+    'macros/solid_mesh_thicken.py': 0.5,
+    'macros/mesh_equivalencer.py': 1.0,
+    'macros/export_mesh_as_bdf.py': 1.0,
+}
+
+# none of these may be pulled in by importing the above
+GUI_MODULES = ['FreeCAD', 'FreeCADGui', 'Fem', 'Part', 'PySide', 'PySide2',
+               'PySide6']
+
+# run in a fresh interpreter: import one module, report time and GUI modules
+PROBE = """
+import importlib.util, json, sys, time
+name = sys.argv[1]
+start = time.perf_counter()
+if name.endswith('.py'):
+    spec = importlib.util.spec_from_file_location('probe', name)
+    spec.loader.exec_module(importlib.util.module_from_spec(spec))
+else:
+    importlib.import_module(name)
+seconds = time.perf_counter() - start
+gui = [m for m in json.loads(sys.argv[2]) if m in sys.modules]
+print(json.dumps([seconds, gui]))
+"""
+
+def get_import_time(name, N_runs=3): # {{{
+    """ Fastest of N_runs imports of name, each in a fresh interpreter
+    name is a module, or the path of a macro relative to this directory.
+    Returns [seconds, GUI modules that got imported].
+    """
+    here = os.path.dirname(os.path.realpath(__file__))
+    best = None
+    for _ in range(N_runs):
+        out = subprocess.run([sys.executable, '-c', PROBE, name,
+                              json.dumps(GUI_MODULES)],
+                             cwd=here, capture_output=True, text=True)
+        if out.returncode != 0:
+            s = "Importing " + name + " failed:\n" + out.stderr
+            raise ValueError(s)
+        [seconds, gui] = json.loads(out.stdout.strip().splitlines()[-1])
+        best = seconds if best is None else min(best, seconds)
+    return [best, gui]
+# }}}
+
+def main(): # {{{
+    """ Import every GUI-free module and macro in a fresh interpreter and
+    check it against its budget, and that no FreeCAD or PySide came along
+    Run as a script: python startup_benchmark.py [N_runs]
+    Exits with 1 if anything is over budget or imports the GUI.
+    """
+    N_runs = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    failed = []
+    print("  import (s)   budget (s)   module")
+    for name, budget in IMPORT_BUDGETS.items():
+        [seconds, gui] = get_import_time(name, N_runs)
+        flag = ""
+        if seconds > budget:
+            flag = "  OVER BUDGET"
+        if len(gui) != 0:
+            flag += "  imports " + ", ".join(gui)
+        if flag != "":
+            failed.append(name)
+        print("{:11.3f}  {:11.3f}   {}{}".format(seconds, budget, name, flag))
+    if len(failed) != 0:
+        print(str(len(failed)) + " modules failed: " + ", ".join(failed))
+        sys.exit(1)
+# }}}
+
+if __name__ == '__main__':
+    main()
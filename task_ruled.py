@@ -43,8 +43,6 @@ import FreeCAD as App
 import FreeCADGui as Gui
 import Part
 
-from mesh_routines import make_mesh_from_edges
-
 from PySide import QtCore, QtGui, QtSvg
 
 QDock, QTree = QtGui.QDockWidget, QtGui.QTreeWidget
@@ -230,6 +228,8 @@ class TaskPanel:
         arguments = (edges, self.spinx.value(), self.spiny.value(),
                      self.cbff.isChecked())
         
+        # numpy and the mesh arrays only load once there's meshing to do
+        from mesh_routines import make_mesh_from_edges
         meshsurf, flipped = make_mesh_from_edges(*arguments)
 
         # Add to doc and making it render correctly